@@ -33,8 +33,10 @@ import customtkinter
 # Local imports.
 #
 from src.app import App
+from src.controllers import Keybinder
 from src.gui import MainGui
 from src.pipeline import Pipeline
+from src.session_recorder import SessionRecorder
 from src.task_killer import TaskKiller
 
 LOG_FORMAT = r"%(asctime)s %(levelname)s %(name)s: %(funcName)s: %(message)s"
@@ -50,6 +52,11 @@ class MainApp(MainGui, Pipeline):
 
         self.is_active = True
 
+        # Detectors and controllers run on their own thread, driven by new
+        # camera frames. The Tk loop only handles the GUI, and copies state
+        # changed by that thread to the Tk variables.
+        self.start_pipeline()
+
         # Enter loop
         self.tk_root.after(50, self.anim_loop)
 
@@ -57,9 +64,7 @@ class MainApp(MainGui, Pipeline):
         try:
             if self.is_active:
                 self.poll_update_state()
-
-                # Run detectors and controllers.
-                self.pipeline_tick()
+                Keybinder().sync_active_var()
                 self.tk_root.after(50, self.anim_loop)
         except Exception as e:
             logging.critical(e, exc_info=e)
@@ -67,6 +72,7 @@ class MainApp(MainGui, Pipeline):
     def close_all(self):
         logging.info("Close all")
         self.is_active = False
+        self.stop_pipeline()
         # Completely close this process
         TaskKiller().exit()
 
@@ -127,6 +133,24 @@ if __name__ == "__main__":
         '--include-prereleases', dest='includePrereleases'
         , action='store_true', help=
         "Include prereleases in the update check and installer download.")
+    argumentParser.add_argument(
+        '--record', dest='recordPath', metavar="DIRECTORY", type=Path, help=
+        "Record camera frames and face landmarker results to a session"
+        " directory, for offline profiling.")
+    argumentParser.add_argument(
+        '--replay', dest='replayPath', metavar="DIRECTORY", type=Path, help=
+        "Replay the camera frames of a recorded session directory instead of"
+        " using a camera.")
+    argumentParser.add_argument(
+        '--camera-source', dest='cameraSources', metavar="SPEC"
+        , action='append', help=
+        "Use a video file, file:PATH, a directory of images, images:DIRECTORY,"
+        " or a generated face, synthetic, instead of the camera devices. Can"
+        " be given more than once.")
+    argumentParser.add_argument(
+        '--replay-speed', dest='replaySpeed', choices=("realtime", "max"),
+        help="Replay with the recorded frame timing, the default, or as fast as"
+        " possible.")
     argumentParser.parse_args(argv[1:], App())
 
     create_app_data_root()
@@ -135,6 +159,8 @@ if __name__ == "__main__":
     tk_root = customtkinter.CTk()
 
     logger.info("Starting main app.")
+    if App().recordPath is not None:
+        SessionRecorder().start(App().recordPath)
     TaskKiller().start()
     main_app = MainApp(tk_root)
     main_app.tk_root.mainloop()
@@ -0,0 +1,4 @@
+"""Headless benchmarks. Run from the repository root, for example:
+
+    python -m benchmarks.preprocess_benchmark
+"""
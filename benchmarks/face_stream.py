@@ -0,0 +1,108 @@
+"""\
+Streams of face landmarker output, either synthetic or loaded from a session
+recorded with the FaceCommander.py --record option, and conversion to the
+FaceLandmarkerResult objects that MediaPipe passes to the result callback.
+"""
+# Standard library imports, in alphabetic order.
+import math
+from pathlib import Path
+#
+# PIP modules, in alphabetic order.
+import numpy as np
+from mediapipe.tasks.python.components.containers.category import Category
+from mediapipe.tasks.python.components.containers.landmark import (
+    NormalizedLandmark)
+from mediapipe.tasks.python.vision import FaceLandmarkerResult
+#
+# Local imports.
+from src.session_recorder import read_detections
+
+N_LANDMARKS = 478
+N_BLENDSHAPES = 52
+
+# Corner, corner, top and bottom landmarks of each eye, as used by FaceMesh.
+LEFT_EYE = (33, 133, 159, 145)
+RIGHT_EYE = (362, 263, 386, 374)
+
+# Blendshape indices that get periodic activations, and their periods in
+# seconds. Indices are those of src.shape_list.blendshape_names.
+GESTURE_PERIODS = {
+    1: 3.1, 2: 3.7, 4: 2.3, 5: 2.9, 26: 1.7, 34: 4.1, 40: 4.3, 41: 5.3
+}
+
+
+def synthetic_stream(n_frames: int, fps: float = 30, seed: int = 0):
+    """Generate a face that moves along a Lissajous curve, blinks and makes
+    gestures now and then.
+
+    Yields:
+        tuple: timestamp_ms, landmarks, blendshapes, matrix
+    """
+    rng = np.random.default_rng(seed)
+
+    # Base face, points scattered in an ellipse around the frame centre.
+    angles = rng.uniform(0, 2 * math.pi, N_LANDMARKS)
+    radii = np.sqrt(rng.uniform(0, 1, N_LANDMARKS))
+    base = np.zeros((N_LANDMARKS, 3), np.float32)
+    base[:, 0] = 0.12 * radii * np.cos(angles)
+    base[:, 1] = 0.16 * radii * np.sin(angles)
+    for eye, x in ((LEFT_EYE, -0.05), (RIGHT_EYE, 0.05)):
+        base[eye[0]] = (x - 0.02, -0.03, 0)
+        base[eye[1]] = (x + 0.02, -0.03, 0)
+
+    for i in range(n_frames):
+        t = i / fps
+        offset = np.array((0.5 + 0.15 * math.sin(0.7 * t),
+                           0.5 + 0.1 * math.sin(1.1 * t), 0), np.float32)
+        landmarks = base + offset
+        landmarks[:, :2] += rng.normal(0, 0.001, (N_LANDMARKS, 2))
+
+        # Eyes are open except for about 0.2 seconds every 4 seconds.
+        eye_height = 0.001 if (t % 4) < 0.2 else 0.012
+        for eye in (LEFT_EYE, RIGHT_EYE):
+            landmarks[eye[2], 1] = landmarks[eye[0], 1] - eye_height
+            landmarks[eye[3], 1] = landmarks[eye[0], 1] + eye_height
+
+        blendshapes = rng.uniform(0, 0.1, N_BLENDSHAPES).astype(np.float32)
+        for index, period in GESTURE_PERIODS.items():
+            if (t % period) < 0.5:
+                blendshapes[index] = 0.9
+
+        matrix = np.eye(4)
+        matrix[:3, :3] = rotation(0.2 * math.sin(0.7 * t),
+                                  0.15 * math.sin(1.1 * t))
+        yield round(t * 1000), landmarks, blendshapes, matrix
+
+
+def rotation(yaw: float, pitch: float) -> np.ndarray:
+    cy, sy = math.cos(yaw), math.sin(yaw)
+    cp, sp = math.cos(pitch), math.sin(pitch)
+    yaw_matrix = np.array(((cy, 0, sy), (0, 1, 0), (-sy, 0, cy)))
+    pitch_matrix = np.array(((1, 0, 0), (0, cp, -sp), (0, sp, cp)))
+    return yaw_matrix @ pitch_matrix
+
+
+def load_stream(directory: Path):
+    """Load the face landmarker results of a recorded session.
+
+    Yields:
+        tuple: timestamp_ms, landmarks, blendshapes, matrix
+    """
+    detections = read_detections(directory)
+    yield from zip(detections["timestamps_ms"].tolist(),
+                   detections["landmarks"], detections["blendshapes"],
+                   detections["matrices"])
+
+
+def to_result(landmarks: np.ndarray, blendshapes: np.ndarray,
+              matrix: np.ndarray) -> FaceLandmarkerResult:
+    return FaceLandmarkerResult(
+        face_landmarks=[[
+            NormalizedLandmark(x=float(x), y=float(y), z=float(z))
+            for x, y, z in landmarks
+        ]],
+        face_blendshapes=[[
+            Category(index=index, score=float(score))
+            for index, score in enumerate(blendshapes)
+        ]],
+        facial_transformation_matrixes=[matrix])
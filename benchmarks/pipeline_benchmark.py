@@ -0,0 +1,179 @@
+"""\
+Headless pipeline benchmark.
+
+Replays a recorded or synthetic stream of face landmarker results through
+FaceMesh.mp_callback, MouseController and Keybinder, the same way as
+Pipeline.pipeline_tick does. Input events are recorded instead of injected, so
+no webcam, display or Windows is needed. Reports per stage latency percentiles and
+calls per second.
+"""
+# Standard library imports, in alphabetic order.
+import argparse
+import json
+from pathlib import Path
+import textwrap
+import time
+#
+# PIP modules, in alphabetic order.
+import numpy as np
+#
+# Local imports.
+from benchmarks import face_stream, recording_input
+
+# Bindings used unless a profile is given. Thresholds are crossed by the
+# synthetic stream now and then.
+SYNTHETIC_MOUSE_BINDINGS = {
+    "Open mouth": ["mouse", "left", 0.5, "single", 0.0],
+    "Mouth left": ["mouse", "right", 0.5, "hold", 0.0],
+    "Mouth right": ["mouse", "middle", 0.5, "dynamic", 0.0],
+    "Raise left eyebrow": ["meta", "reset", 0.5, "single", 0.0],
+}
+SYNTHETIC_KEYBOARD_BINDINGS = {
+    "Raise right eyebrow": ["keyboard", "a", 0.5, "toggle", 0.0],
+    "Lower left eyebrow": ["keyboard", "b", 0.5, "rapid", 0.0],
+    "Lower right eyebrow": ["keyboard", "c", 0.5, "hold", 0.0],
+    "Roll lower mouth": ["keyboard", "d", 0.5, "single", 0.0],
+    "Eye blink": ["keyboard", "e", 0.5, "single", 0.0],
+}
+
+
+class StageTimes:
+
+    def __init__(self):
+        self.durations = {}
+
+    def time(self, stage, function, *args):
+        t0 = time.perf_counter()
+        result = function(*args)
+        self.durations.setdefault(stage, []).append(time.perf_counter() - t0)
+        return result
+
+    def report(self):
+        print(f"{'stage':<16}{'calls':>8}{'calls/s':>12}"
+              f"{'p50 us':>10}{'p95 us':>10}{'p99 us':>10}{'max us':>10}")
+        for stage, durations in self.durations.items():
+            durations = np.array(durations) * 1e6
+            p50, p95, p99 = np.percentile(durations, (50, 95, 99))
+            print(f"{stage:<16}{len(durations):>8}"
+                  f"{len(durations) / durations.sum() * 1e6:>12.0f}"
+                  f"{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}"
+                  f"{durations.max():>10.1f}")
+
+
+def load_config(profile):
+    from src.config_manager import ConfigManager, load_default_config
+
+    if profile is None:
+        ConfigManager().config = load_default_config()
+        ConfigManager().mouse_bindings = SYNTHETIC_MOUSE_BINDINGS
+        ConfigManager().keyboard_bindings = SYNTHETIC_KEYBOARD_BINDINGS
+    else:
+        for attribute, filename in (
+                ("config", "cursor.json"),
+                ("mouse_bindings", "mouse_bindings.json"),
+                ("keyboard_bindings", "keyboard_bindings.json")):
+            with Path(profile, filename).open() as file:
+                setattr(ConfigManager(), attribute, json.load(file))
+        ConfigManager().config = {
+            **load_default_config(),
+            **ConfigManager().config
+        }
+
+
+def main(args):
+    recording_input.install()
+
+    # Imported after the stand-ins are installed.
+    from src.config_manager import ConfigManager
+    from src.controllers import Keybinder, MouseController
+    from src.detectors import FaceMesh
+
+    load_config(args.profile)
+    ConfigManager().config["input_backend"] = "recording"
+    # The stream is replayed faster than real time, so the wall clock based
+    # throttle would suppress nearly every action.
+    ConfigManager().set_throttle_time(0)
+    MouseController().start(run_loop=False)
+    Keybinder().start()
+    Keybinder().set_active(True)
+
+    if args.recording is None:
+        stream = face_stream.synthetic_stream(args.frames, args.fps)
+    else:
+        stream = face_stream.load_stream(args.recording)
+    ticks_per_frame = max(round(args.mouse_rate / args.fps), 1)
+
+    mouse_sink = MouseController().sink
+    key_sink = Keybinder().sink
+    times = StageTimes()
+    # Seconds from each result's arrival to the input events it caused. The
+    # stream's timestamps aren't on the perf_counter clock, and there's no
+    # camera, so this is the result to action part of glass to action.
+    action_latencies = {"key and button": [], "pointer": []}
+    frames = 0
+    no_face_frames = 0
+    t0 = time.perf_counter()
+    for timestamp_ms, landmarks, blendshapes, matrix in stream:
+        result = face_stream.to_result(landmarks, blendshapes, matrix)
+        n_key_events = len(key_sink.events)
+        n_mouse_events = len(mouse_sink.events)
+
+        result_time = time.perf_counter()
+        times.time("mp_callback", FaceMesh().mp_callback, result, None,
+                   timestamp_ms)
+        tracking_sample = FaceMesh().get_tracking_sample()
+        if tracking_sample is None:
+            # No face, so the controllers aren't acted on, as in
+            # Pipeline.pipeline_tick. The pointer thread still ticks.
+            no_face_frames += 1
+        else:
+            MouseController().act(*tracking_sample)
+            # With the stream's timestamps, as in Pipeline.pipeline_tick, so
+            # that blink holds are timed on the stream's clock.
+            times.time("keybinder", Keybinder().act,
+                       *FaceMesh().get_blendshapes_sample())
+        for _ in range(ticks_per_frame):
+            times.time("mouse_tick", MouseController().tick)
+        for name, sink, n_events in (
+                ("key and button", key_sink, n_key_events),
+                ("pointer", mouse_sink, n_mouse_events)):
+            action_latencies[name].extend(
+                event[0] - result_time for event in sink.events[n_events:])
+        frames += 1
+    elapsed = time.perf_counter() - t0
+
+    print(f"{frames} frames in {elapsed:.2f} s, including result"
+          f" construction, {ticks_per_frame} mouse ticks per frame,"
+          f" {no_face_frames} frames without a face.")
+    times.report()
+    for name, latencies in action_latencies.items():
+        if latencies:
+            latencies = np.array(latencies) * 1e6
+            p50, p95 = np.percentile(latencies, (50, 95))
+            print(f"Result to {name} event latency p50 {p50:.1f} us,"
+                  f" p95 {p95:.1f} us, max {latencies.max():.1f} us.")
+    print(f"Recorded {len(mouse_sink.events)} pointer events in"
+          f" {mouse_sink.n_submits} submissions and {len(key_sink.events)}"
+          f" key and button events in {key_sink.n_submits} submissions.")
+
+
+if __name__ == "__main__":
+    argumentParser = argparse.ArgumentParser(
+        description=textwrap.dedent(__doc__),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    argumentParser.add_argument(
+        '--recording', type=Path, help=
+        "Session directory recorded with FaceCommander.py --record. Default is"
+        " a synthetic stream.")
+    argumentParser.add_argument(
+        '--profile', type=Path, help=
+        "Profile directory with cursor and bindings JSON files. Default is the"
+        " built-in default cursor config and a set of synthetic bindings.")
+    argumentParser.add_argument('--frames', type=int, default=1000,
+                                help="Number of synthetic frames.")
+    argumentParser.add_argument('--fps', type=float, default=30,
+                                help="Detector result rate.")
+    argumentParser.add_argument(
+        '--mouse-rate', dest='mouse_rate', type=float, default=60,
+        help="Mouse controller tick rate in Hz.")
+    main(argumentParser.parse_args())
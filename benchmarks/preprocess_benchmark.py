@@ -0,0 +1,124 @@
+"""\
+Camera frame preprocessing micro-benchmark.
+
+Compares the original allocate-per-step preprocessing chain with
+FramePreprocessor writing into a frame ring buffer slot. Reports time per
+frame and the transient memory allocated per frame, as seen by tracemalloc.
+Then compares mirroring and converting to RGB with cv2.flip and cv2.cvtColor,
+in two passes, against the single pass of mirror_bgr_to_rgb.
+"""
+# Standard library imports, in alphabetic order.
+import argparse
+import textwrap
+import time
+import tracemalloc
+#
+# PIP modules, in alphabetic order.
+import cv2
+import numpy as np
+#
+# Local imports.
+from src.utils.frame_preprocessor import FramePreprocessor, mirror_bgr_to_rgb
+from src.utils.frame_ring_buffer import FrameRingBuffer
+
+
+def original_chain(frame, fix_width, fix_height):
+    h, w, _ = frame.shape
+    if h != fix_height or w != fix_width:
+        target_width = int(h * 4 / 3)
+        if w > target_width:
+            trim_width = w - target_width
+            trim_left = trim_width // 2
+            trim_right = trim_width - trim_left
+            frame = frame[:, trim_left:-trim_right, :]
+        frame = cv2.resize(frame, (fix_width, fix_height))
+    frame = cv2.flip(frame, 1)
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+
+def two_pass_mirror(src, dst):
+    cv2.flip(src, 1, dst=dst)
+    cv2.cvtColor(dst, cv2.COLOR_BGR2RGB, dst=dst)
+
+
+def measure(name, step, frames):
+    # Warm up, so that cached geometry and buffers exist.
+    step(frames[0])
+
+    durations = np.empty(len(frames))
+    for i, frame in enumerate(frames):
+        t0 = time.perf_counter()
+        step(frame)
+        durations[i] = time.perf_counter() - t0
+
+    tracemalloc.start()
+    peaks = np.empty(len(frames))
+    for i, frame in enumerate(frames):
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        step(frame)
+        _, peak = tracemalloc.get_traced_memory()
+        peaks[i] = peak - current
+    tracemalloc.stop()
+
+    durations *= 1000
+    print(f"{name:>14}: mean {durations.mean():.3f} ms"
+          f" p95 {np.percentile(durations, 95):.3f} ms"
+          f" allocated {peaks.mean() / 1024:.1f} KiB/frame")
+
+
+def main(args):
+    rng = np.random.default_rng(0)
+    frames = [
+        rng.integers(0, 256, (args.height, args.width, 3), np.uint8)
+        for _ in range(8)
+    ]
+    frames = [frames[i % len(frames)] for i in range(args.frames)]
+    print(f"{args.frames} frames {args.width}x{args.height}"
+          f" to {args.fix_width}x{args.fix_height}")
+
+    measure("before",
+            lambda frame: original_chain(frame, args.fix_width,
+                                         args.fix_height), frames)
+
+    ring = FrameRingBuffer()
+    preprocessor = FramePreprocessor()
+    shape = (args.fix_height, args.fix_width, 3)
+
+    def ring_step(frame):
+        preprocessor.process(frame, ring.get_write_buffer(shape))
+        ring.commit(time.perf_counter())
+
+    measure("after", ring_step, frames)
+
+    mirror_frames = [
+        cv2.resize(frame, (args.fix_width, args.fix_height))
+        for frame in frames
+    ]
+    dst = np.empty(shape, np.uint8)
+    two_pass_mirror(mirror_frames[0], dst)
+    expected = dst.copy()
+    mirror_bgr_to_rgb(mirror_frames[0], dst)
+    if not np.array_equal(dst, expected):
+        raise AssertionError("mirror_bgr_to_rgb doesn't match two passes.")
+    measure("mirror 2-pass",
+            lambda frame: two_pass_mirror(frame, dst), mirror_frames)
+    measure("mirror 1-pass",
+            lambda frame: mirror_bgr_to_rgb(frame, dst), mirror_frames)
+
+
+if __name__ == "__main__":
+    argumentParser = argparse.ArgumentParser(
+        description=textwrap.dedent(__doc__),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    argumentParser.add_argument('--width', type=int, default=1280,
+                                help="Camera frame width.")
+    argumentParser.add_argument('--height', type=int, default=720,
+                                help="Camera frame height.")
+    argumentParser.add_argument('--fix-width', dest='fix_width', type=int,
+                                default=640, help="Detector frame width.")
+    argumentParser.add_argument('--fix-height', dest='fix_height', type=int,
+                                default=480, help="Detector frame height.")
+    argumentParser.add_argument('--frames', type=int, default=500,
+                                help="Number of frames to process.")
+    main(argumentParser.parse_args())
@@ -0,0 +1,29 @@
+"""\
+Stand-ins for the Windows modules and Tk, so that the controllers can be
+imported and driven on a headless machine. Input events are recorded by the
+controllers' sinks, with the recording input backend.
+"""
+# Standard library imports, in alphabetic order.
+import sys
+import tkinter
+import types
+
+# The same as the screen size of the recording input backend.
+SCREEN_SIZE = (1920, 1080)
+
+
+def EnumDisplayMonitors():
+    return [(None, None, (0, 0, *SCREEN_SIZE))]
+
+
+def install():
+    """Install the stand-ins. Call before anything imports src.controllers,
+    and set the input_backend config to recording before starting them.
+    """
+    win32api = types.ModuleType("win32api")
+    win32api.EnumDisplayMonitors = EnumDisplayMonitors
+    sys.modules["win32api"] = win32api
+
+    # The controllers keep their state in Tk variables. A Tcl interpreter
+    # without a window is enough for those.
+    tkinter._default_root = tkinter.Tcl()
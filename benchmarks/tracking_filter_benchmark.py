@@ -0,0 +1,169 @@
+"""\
+Tracking filter benchmark.
+
+Replays a recorded or synthetic stream of face landmarker results through each
+tracking location filter that FaceMesh can be configured with, and the Hamming
+window pointer smoothing of MouseController for comparison. Reports for each
+filter:
+
+- jitter, the RMS frame to frame change in velocity of the filtered tracking
+  location, in pixels.
+- lag, the delay of the filtered location behind a zero-lag smoothing of the
+  raw location, found by lining up their velocities, in milliseconds.
+- update time per result, in microseconds.
+"""
+# Standard library imports, in alphabetic order.
+import argparse
+from pathlib import Path
+import textwrap
+import time
+#
+# PIP modules, in alphabetic order.
+import numpy as np
+#
+# Local imports.
+from benchmarks import face_stream
+
+# Filter settings compared, on top of the built-in default cursor config.
+VARIANTS = {
+    "none": {"tracking_filter": "none"},
+    "one_euro default": {"tracking_filter": "one_euro"},
+    "one_euro beta=0.05": {
+        "tracking_filter": "one_euro",
+        "tracking_filter_beta": 0.05
+    },
+    "kalman default": {"tracking_filter": "kalman"},
+    "kalman r=10": {
+        "tracking_filter": "kalman",
+        "tracking_filter_measurement_noise": 10.0
+    },
+}
+
+# Longest lag searched for, in results.
+MAX_LAG = 15
+
+# Length of the centred window that makes the zero-lag reference.
+REFERENCE_WINDOW = 9
+
+
+def raw_locations(stream, config) -> tuple[np.ndarray, np.ndarray]:
+    """Unfiltered tracking locations, the same as
+    FaceMesh.calculate_tracking_location without the transformation matrix.
+
+    Returns:
+        tuple: timestamps in seconds, locations in frame pixels
+    """
+    size = np.array((config["fix_width"], config["fix_height"]))
+    timestamps = []
+    locations = []
+    for timestamp_ms, landmarks, _, _ in stream:
+        points = np.asarray(landmarks)[config["tracking_vert_idxs"], :2]
+        timestamps.append(timestamp_ms / 1000)
+        locations.append(points.mean(axis=0) * size)
+    return np.array(timestamps), np.array(locations)
+
+
+def zero_lag_reference(raw: np.ndarray) -> np.ndarray:
+    """Raw locations smoothed with a centred window, so noise is removed
+    without delaying the motion. Ends that the window doesn't fit are kept
+    raw.
+    """
+    kernel = np.hamming(REFERENCE_WINDOW)
+    kernel /= kernel.sum()
+    reference = raw.copy()
+    half = REFERENCE_WINDOW // 2
+    for axis in range(raw.shape[1]):
+        reference[half:-half, axis] = np.convolve(raw[:, axis], kernel,
+                                                  mode="valid")
+    return reference
+
+
+def lag_frames(reference: np.ndarray, filtered: np.ndarray) -> float:
+    """Shift of filtered behind reference that best correlates their
+    velocities, refined to a fraction of a result by parabolic
+    interpolation.
+    """
+    reference_velocity = np.diff(reference, axis=0)
+    filtered_velocity = np.diff(filtered, axis=0)
+    n = len(reference_velocity) - MAX_LAG
+    scores = np.array([
+        np.sum(reference_velocity[:n] * filtered_velocity[lag:lag + n])
+        for lag in range(MAX_LAG + 1)
+    ])
+    lag = int(np.argmax(scores))
+    if 0 < lag < MAX_LAG:
+        before, peak, after = scores[lag - 1:lag + 2]
+        curvature = before - 2 * peak + after
+        if curvature < 0:
+            return lag + 0.5 * (before - after) / curvature
+    return float(lag)
+
+
+def jitter(filtered: np.ndarray) -> float:
+    acceleration = np.diff(filtered, n=2, axis=0)
+    return float(np.sqrt(np.mean(np.sum(acceleration**2, axis=1))))
+
+
+def run_filter(update, timestamps, locations) -> tuple[np.ndarray, float]:
+    filtered = np.empty_like(locations)
+    t0 = time.perf_counter()
+    for i, (timestamp, location) in enumerate(zip(timestamps, locations)):
+        filtered[i] = update(location, timestamp)
+    elapsed = time.perf_counter() - t0
+    return filtered, elapsed / len(locations) * 1e6
+
+
+def main(args):
+    from src.config_manager import load_default_config
+    from src.detectors.facemesh import create_tracking_filter
+    import src.utils as utils
+
+    config = load_default_config()
+    if args.recording is None:
+        stream = face_stream.synthetic_stream(args.frames, args.fps)
+    else:
+        stream = face_stream.load_stream(args.recording)
+    timestamps, locations = raw_locations(stream, config)
+    if len(locations) < 4 * MAX_LAG:
+        raise SystemExit(f"{len(locations)} results isn't enough, at least"
+                         f" {4 * MAX_LAG} are needed.")
+    reference = zero_lag_reference(locations)
+    interval_ms = np.median(np.diff(timestamps)) * 1000
+
+    results = {}
+    for name, settings in VARIANTS.items():
+        tracking_filter = create_tracking_filter({**config, **settings})
+        if tracking_filter is None:
+            update = lambda location, timestamp: location
+        else:
+            update = tracking_filter.update
+        results[name] = run_filter(update, timestamps, locations)
+
+    fir = utils.FIRFilter(utils.calc_smooth_kernel(config["pointer_smooth"]),
+                          2)
+    fir.reset(locations[0])
+    results[f"pointer_smooth={config['pointer_smooth']}"] = run_filter(
+        lambda location, timestamp: fir.update(location), timestamps,
+        locations)
+
+    print(f"{len(locations)} results, {interval_ms:.1f} ms apart.")
+    print(f"{'filter':<22}{'jitter px':>10}{'lag ms':>10}{'update us':>11}")
+    for name, (filtered, update_us) in results.items():
+        lag_ms = lag_frames(reference, filtered) * interval_ms
+        print(f"{name:<22}{jitter(filtered):>10.3f}{lag_ms:>10.1f}"
+              f"{update_us:>11.1f}")
+
+
+if __name__ == "__main__":
+    argumentParser = argparse.ArgumentParser(
+        description=textwrap.dedent(__doc__),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    argumentParser.add_argument(
+        '--recording', type=Path, help=
+        "Session directory recorded with FaceCommander.py --record. Default is"
+        " a synthetic stream.")
+    argumentParser.add_argument('--frames', type=int, default=1000,
+                                help="Number of synthetic frames.")
+    argumentParser.add_argument('--fps', type=float, default=30,
+                                help="Detector result rate.")
+    main(argumentParser.parse_args())
@@ -1,5 +1,16 @@
 import abc
-import math
+
+import numpy as np
+import numpy.typing as npt
+
+# Speeds in pixels per tick that lookup tables cover. The gain at higher
+# speeds is the gain at LUT_MAX_SPEED.
+LUT_MAX_SPEED = 64.0
+LUT_SIZE = 257
+
+# Speed, gain points of the default points curve, close to the default
+# sigmoid.
+DEFAULT_POINTS = ((0.0, 0.2), (5.0, 0.6), (10.0, 1.0), (15.0, 1.2))
 
 
 class AccelGraph(metaclass=abc.ABCMeta):
@@ -12,15 +23,122 @@ class AccelGraph(metaclass=abc.ABCMeta):
         pass
 
 
-class SigmoidAccel(AccelGraph):
+class LUTAccel(AccelGraph):
+    """Gain curve sampled into a lookup table once, and linearly
+    interpolated. Takes a speed, or an array of speeds.
 
-    def __init__(self, shift_x=5, slope=0.3, multiply=1.2):
+    Args:
+        max_speed (float): highest speed in the table
+    """
+
+    def __init__(self, max_speed: float = LUT_MAX_SPEED):
         super().__init__()
+        self.speeds = np.linspace(0.0, max_speed, LUT_SIZE)
+        self.gains = np.asarray(self.curve(self.speeds), np.float64)
+        # Plain floats for single speeds, which are faster to index than
+        # arrays.
+        self.gain_list = self.gains.tolist()
+        self.inverse_step = (LUT_SIZE - 1) / max_speed
+
+    @abc.abstractmethod
+    def curve(self, speeds: npt.NDArray[np.float64]) -> npt.ArrayLike:
+        pass
+
+    def __call__(self, x: float | npt.NDArray) -> float | npt.NDArray:
+        if isinstance(x, np.ndarray):
+            return np.interp(np.abs(x), self.speeds, self.gains)
+        position = abs(x) * self.inverse_step
+        if position >= LUT_SIZE - 1:
+            return self.gain_list[-1]
+        i = int(position)
+        gain = self.gain_list[i]
+        return gain + (position - i) * (self.gain_list[i + 1] - gain)
+
+
+class SigmoidAccel(LUTAccel):
+    """Gain that rises from about 0 to multiply around shift_x, more
+    steeply the higher the slope.
+    """
+
+    def __init__(self, shift_x=5, slope=0.3, multiply=1.2):
         self.shift_x = shift_x
         self.slope = slope
         self.multiply = multiply
+        super().__init__()
 
-    def __call__(self, x: float) -> float:
-        x = abs(x)
-        sig = 1 / (1 + math.exp(-self.slope * (x - self.shift_x)))
-        return self.multiply * sig
+    def curve(self, speeds):
+        return self.multiply / (1 + np.exp(-self.slope *
+                                           (speeds - self.shift_x)))
+
+
+class PowerAccel(LUTAccel):
+    """Gain that grows with a power of the speed, and is multiply at
+    shift_x.
+    """
+
+    def __init__(self, shift_x=5, exponent=0.5, multiply=1.2):
+        if shift_x <= 0:
+            raise ValueError("Power acceleration shift_x must be positive.")
+        self.shift_x = shift_x
+        self.exponent = exponent
+        self.multiply = multiply
+        super().__init__()
+
+    def curve(self, speeds):
+        return self.multiply * (speeds / self.shift_x)**self.exponent
+
+
+class PointsAccel(LUTAccel):
+    """Piecewise linear gain through speed, gain points. The gain is constant
+    past the first and last points.
+
+    Args:
+        points (list): [speed, gain] pairs, in pixels per tick
+    """
+
+    def __init__(self, points=DEFAULT_POINTS):
+        points = sorted((float(speed), float(gain)) for speed, gain in points)
+        if not points:
+            raise ValueError("Acceleration curve needs at least one point.")
+        self.points = np.array(points)
+        # The gain is constant past the last point, so the table ends there.
+        super().__init__(max(self.points[-1, 0], 1.0))
+
+    def curve(self, speeds):
+        return np.interp(speeds, self.points[:, 0], self.points[:, 1])
+
+
+ACCEL_CURVES = {
+    "sigmoid": SigmoidAccel,
+    "power": PowerAccel,
+    "points": PointsAccel,
+}
+
+
+def create_accel(curve: str,
+                 params: dict | None = None,
+                 points=DEFAULT_POINTS) -> AccelGraph:
+    """
+    Args:
+        curve (str): sigmoid, power or points
+        params (dict): curve name to the keyword arguments of its class, for
+            the sigmoid and power curves. Missing ones take their defaults.
+        points (list): [speed, gain] pairs of the points curve
+
+    Raises:
+        ValueError: if curve isn't one of those, or its parameters or points
+            aren't valid
+    """
+    if curve == "points":
+        return PointsAccel(points)
+    try:
+        curve_class = ACCEL_CURVES[curve]
+    except KeyError:
+        raise ValueError(f'Unknown acceleration curve "{curve}".'
+                         f' Expected one of {", ".join(ACCEL_CURVES)}.')
+    curve_params = (params or {}).get(curve, {})
+    try:
+        return curve_class(**curve_params)
+    except TypeError as e:
+        raise ValueError(f'Bad {curve} acceleration parameters'
+                         f' {curve_params}: {e}')
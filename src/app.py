@@ -31,6 +31,7 @@ APP_NAME = "FaceCommander"
 APP_AUTHOR = "AceCentre"
 
 LOG_FILENAME = "log.txt"
+CAMERA_CACHE_FILENAME = "cameras.json"
 
 VERSION_INI_FILE = ("assets", "Version.ini")
 VERSION_INI_SECTION = "Release"
@@ -76,6 +77,10 @@ class App(metaclass=Singleton):
         self._userAgentHeader = True
         self._releaseInformationDelay = 0
         self._includePrereleases = False
+        self._recordPath = None
+        self._replayPath = None
+        self._cameraSources = None
+        self._replaySpeed = "realtime"
 
         # Top-level paths.
         if getattr(sys, "frozen", False):
@@ -93,6 +98,7 @@ class App(metaclass=Singleton):
         self._version = None
 
         self._logPath = None
+        self._cameraCachePath = None
         self._profilesDirectory = None
         self._builtInProfilesDirectory = None
         self._updateDirectory = None
@@ -127,6 +133,38 @@ class App(metaclass=Singleton):
     def includePrereleases(self, includePrereleases):
         self._includePrereleases = includePrereleases
 
+    @property
+    def recordPath(self):
+        return self._recordPath
+
+    @recordPath.setter
+    def recordPath(self, recordPath):
+        self._recordPath = recordPath
+
+    @property
+    def replayPath(self):
+        return self._replayPath
+
+    @replayPath.setter
+    def replayPath(self, replayPath):
+        self._replayPath = replayPath
+
+    @property
+    def cameraSources(self):
+        return self._cameraSources
+
+    @cameraSources.setter
+    def cameraSources(self, cameraSources):
+        self._cameraSources = cameraSources
+
+    @property
+    def replaySpeed(self):
+        return self._replaySpeed
+
+    @replaySpeed.setter
+    def replaySpeed(self, replaySpeed):
+        self._replaySpeed = replaySpeed
+
     # End of command line switches.
 
     @property
@@ -159,6 +197,12 @@ class App(metaclass=Singleton):
             self._logPath = Path(self.dataRoot, LOG_FILENAME)
         return self._logPath
 
+    @property
+    def cameraCachePath(self):
+        if self._cameraCachePath is None:
+            self._cameraCachePath = Path(self.dataRoot, CAMERA_CACHE_FILENAME)
+        return self._cameraCachePath
+
     @property
     def profilesDirectory(self):
         if self._profilesDirectory is None:
@@ -10,23 +10,60 @@ import numpy.typing as npt
 from PIL import Image
 
 import src.utils as utils
+from src.app import App
 from src.config_manager import ConfigManager
 from src.controllers import Keybinder
+from src.session_recorder import SessionRecorder, SessionReplayer
+from src.utils.camera_source import VideoCaptureSource
 from src.singleton_meta import Singleton
+from src.stage_timings import StageTimings
 
 MAX_SEARCH_CAMS = 5
 
+# Seconds between refreshes of the stage timings drawn on the debug frame.
+STAGE_TIMINGS_REFRESH = 0.5
+
 logger = logging.getLogger("CameraManager")
 
 
-def add_overlay(background, overlay, x, y, width, height):
+class StatusOverlay:
+    """Status banner image, kept as premultiplied alpha and cropped to the
+    rows that aren't fully transparent.
+
+    Args:
+        path (str): PNG with an alpha channel, the size of the frame
+    """
+
+    def __init__(self, path: str):
+        bgra = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        rows = np.flatnonzero(bgra[..., 3].max(axis=1))
+        bgra = bgra[:rows[-1] + 1 if rows.size else 0]
+        alpha = bgra[..., 3:] / 255
+        rgb = cv2.cvtColor(bgra, cv2.COLOR_BGRA2RGB)
+        self.premultiplied = np.round(rgb * alpha).astype(np.uint8)
+        # 255 times the share of the frame that shows through, per channel.
+        self.transparency = np.round(
+            np.repeat(255 * (1 - alpha), 3, axis=2)).astype(np.uint8)
 
-    background_section = background[y:y + height, x:x + width]
-    overlay_section = overlay[y:y + height, x:x + width]
-    background[y:y + height,
-               x:x + width] = cv2.addWeighted(background_section, 0.3,
-                                              overlay_section, 0.7, 0)
-    return background
+    def draw(self, frame: npt.NDArray[np.uint8],
+             dst: npt.NDArray[np.uint8]) -> None:
+        """Blend the banner over a frame, writing each pixel of dst once.
+
+        Args:
+            frame (ndarray): RGB frame, not changed
+            dst (ndarray): frame sized output, which can be frame itself
+        """
+        height = min(len(self.premultiplied), frame.shape[0])
+        width = min(self.premultiplied.shape[1], frame.shape[1])
+        banner = dst[:height, :width]
+        cv2.multiply(frame[:height, :width],
+                     self.transparency[:height, :width],
+                     dst=banner,
+                     scale=1 / 255)
+        cv2.add(banner, self.premultiplied[:height, :width], dst=banner)
+        if dst is not frame:
+            dst[:height, width:] = frame[:height, width:]
+            dst[height:] = frame[height:]
 
 
 class CameraManager(metaclass=Singleton):
@@ -40,28 +77,30 @@ class CameraManager(metaclass=Singleton):
         self.placeholder_im = np.array(self.placeholder_im.convert('RGB'))
 
         # Overlays
-        self.overlay_active = cv2.cvtColor(
-            cv2.imread("assets/images/overlays/active.png",
-                       cv2.IMREAD_UNCHANGED), cv2.COLOR_BGRA2RGB)
-        self.overlay_disabled = cv2.cvtColor(
-            cv2.imread("assets/images/overlays/disabled.png",
-                       cv2.IMREAD_UNCHANGED), cv2.COLOR_BGRA2RGB)
-        self.overlay_face_not_detected = cv2.cvtColor(
-            cv2.imread("assets/images/overlays/face_not_detected.png",
-                       cv2.IMREAD_UNCHANGED), cv2.COLOR_BGRA2RGB)
-
-        # Use dict for pass as reference
-        self.frame_buffers = {
-            "raw": self.placeholder_im,
-            "debug": self.placeholder_im
-        }
+        self.overlay_active = StatusOverlay(
+            "assets/images/overlays/active.png")
+        self.overlay_disabled = StatusOverlay(
+            "assets/images/overlays/disabled.png")
+        self.overlay_face_not_detected = StatusOverlay(
+            "assets/images/overlays/face_not_detected.png")
+
+        self.placeholder_im.flags.writeable = False
+
+        # Raw frames written by the camera thread.
+        self.frame_ring = utils.FrameRingBuffer()
+        # Debug frames drawn by the pipeline thread, so that they aren't
+        # allocated per frame and previews can tell when there's a new one.
+        self.debug_ring = utils.FrameRingBuffer()
+        # Stage timings text drawn on the debug frame, and when it was made.
+        self.stage_timings_lines = []
+        self.stage_timings_time = 0
         self.is_active = False
         self.is_destroyed = False
 
     def start(self):
         if not self.is_active:
             logger.info("Start CameraManager singleton")
-            self.thread_cameras = ThreadCameras(self.frame_buffers)
+            self.thread_cameras = ThreadCameras(self.frame_ring)
             self.is_active = True
 
     def get_camera_list(self) -> list[int]:
@@ -71,6 +110,17 @@ class CameraManager(metaclass=Singleton):
 
         return sorted(cameras)
 
+    def get_camera_name(self, camera_id: int) -> str | None:
+        """Display name of a camera, or None if there's nothing better than
+        its id.
+        """
+        if not self.is_active:
+            return None
+        source = self.thread_cameras.cameras.get(camera_id)
+        if source is None or isinstance(source, VideoCaptureSource):
+            return utils.get_camera_name(camera_id)
+        return source.name
+
     def get_current_camera_id(self) -> int | None:
         if not self.is_active:
             return None
@@ -79,19 +129,53 @@ class CameraManager(metaclass=Singleton):
 
     def pick_camera(self, camera_id: int):
         logger.info(f"Swapping to camera id: {camera_id}")
-        # Assign to ref
-        self.frame_buffers["raw"] = self.placeholder_im
-        self.frame_buffers["debug"] = self.placeholder_im
+        self.frame_ring.clear()
+        self.debug_ring.clear()
         self.thread_cameras.pick_camera(camera_id)
 
-    def get_raw_frame(self):
-        return self.frame_buffers["raw"].copy()
+    def get_latest_frame(self) -> tuple[int, float, npt.NDArray] | None:
+        """Borrow the latest raw frame.
+
+        Returns:
+            tuple: (sequence number, capture timestamp, read-only frame) or
+                None if the camera hasn't delivered a frame yet
+        """
+        return self.frame_ring.get_latest()
+
+    def wait_new_frame(self, seq: int, timeout: float) -> bool:
+        """Block until a raw frame newer than seq is available.
+
+        Args:
+            seq (int): sequence number of the last frame processed
+            timeout (float): maximum seconds to wait
 
-    def get_debug_frame(self):
-        return self.frame_buffers["debug"]
+        Returns:
+            bool: True if a newer frame arrived, False on timeout
+        """
+        return self.frame_ring.wait_newer(seq, timeout)
 
-    def put_debug_frame(self, frame_debug: npt.ArrayLike):
-        self.frame_buffers["debug"] = frame_debug
+    def get_raw_frame_sample(self) -> tuple[int, npt.NDArray]:
+        """
+        Returns:
+            tuple: (sequence number, read-only view of the latest raw frame)
+                or (0, placeholder) if the camera hasn't delivered a frame yet
+        """
+        latest = self.frame_ring.get_latest()
+        if latest is None:
+            return 0, self.placeholder_im
+        return latest[0], latest[2]
+
+    def get_debug_frame_sample(self) -> tuple[int, npt.NDArray]:
+        """
+        Returns:
+            tuple: (sequence number, read-only view of the latest debug frame)
+                or (0, placeholder) if none has been drawn since the camera
+                was picked
+        """
+        latest = self.debug_ring.get_latest()
+        if latest is None:
+            return 0, self.placeholder_im
+        return latest[0], latest[2]
 
     def leave(self):
         if self.thread_cameras is not None:
@@ -102,44 +186,68 @@ class CameraManager(metaclass=Singleton):
         if self.thread_cameras is not None:
             self.thread_cameras.destroy()
 
-    def draw_overlay(self, tracking_location):
+    def draw_stage_timings(self, frame_debug: npt.NDArray) -> None:
+        """Draw the stage timings below the overlay banner, if the
+        show_stage_timings option is on.
+        """
+        if not ConfigManager().config["show_stage_timings"]:
+            return
+        now = time.perf_counter()
+        if now - self.stage_timings_time > STAGE_TIMINGS_REFRESH:
+            self.stage_timings_lines = StageTimings().format_stats()
+            self.stage_timings_time = now
+        for i, line in enumerate(self.stage_timings_lines):
+            cv2.putText(frame_debug, line, (8, 126 + 16 * i),
+                        cv2.FONT_HERSHEY_PLAIN, 1, (255, 255, 0), 1,
+                        cv2.LINE_AA)
+
+    def draw_overlay(self, frame_rgb: npt.ArrayLike, tracking_location):
         if not self.is_active:
             return
 
-        self.frame_buffers["debug"] = self.frame_buffers["raw"].copy()
+        overlay_start = time.perf_counter()
+        # The raw frame is borrowed, so the debug frame is drawn into a slot
+        # of its own.
+        frame_debug = self.debug_ring.get_write_buffer(frame_rgb.shape)
 
         # Disabled
-        if not Keybinder().is_active.get():
-            self.frame_buffers["debug"] = add_overlay(
-                self.frame_buffers["debug"], self.overlay_disabled, 0, 0, 640,
-                108)
+        if not Keybinder().active_flag:
+            self.overlay_disabled.draw(frame_rgb, frame_debug)
+            self.publish_debug_frame(frame_debug, overlay_start)
             return
 
         # Face not detected
         if (tracking_location is None):
-            self.frame_buffers["debug"] = add_overlay(
-                self.frame_buffers["debug"], self.overlay_face_not_detected, 0,
-                0, 640, 108)
-
+            self.overlay_face_not_detected.draw(frame_rgb, frame_debug)
+            self.publish_debug_frame(frame_debug, overlay_start)
             return
 
         # Active
+        np.copyto(frame_debug, frame_rgb)
 
         if ConfigManager().config["use_transformation_matrix"]:
             cx = ConfigManager().config["fix_width"] // 2
             cy = ConfigManager().config["fix_height"] // 2
-            cv2.line(self.frame_buffers["debug"], (cx, cy),
+            cv2.line(frame_debug, (cx, cy),
                      (int(tracking_location[0]), int(tracking_location[1])), (0, 255, 0), 3)
 
-            cv2.circle(self.frame_buffers["debug"],
+            cv2.circle(frame_debug,
                        (int(tracking_location[0]), int(tracking_location[1])), 6, (255, 0, 0),
                        -1)
 
         else:
-            cv2.circle(self.frame_buffers["debug"],
+            cv2.circle(frame_debug,
                        (int(tracking_location[0]), int(tracking_location[1])), 4,
                        (255, 255, 255), -1)
 
+        self.publish_debug_frame(frame_debug, overlay_start)
+
+    def publish_debug_frame(self, frame_debug: npt.NDArray,
+                            overlay_start: float) -> None:
+        self.draw_stage_timings(frame_debug)
+        self.debug_ring.commit(overlay_start)
+        StageTimings().record("overlay", overlay_start)
+
 
 # ---------------------------------------------------------------------------- #
 #                                 THREAD CAMERA                                #
@@ -148,25 +256,41 @@ class CameraManager(metaclass=Singleton):
 
 class ThreadCameras():
 
-    def __init__(self, frame_buffers: dict):
+    def __init__(self, frame_ring: utils.FrameRingBuffer):
         logger.info("Initializing ThreadCamera")
         self.lock = threading.Lock()
-        self.pool = futures.ThreadPoolExecutor(max_workers=8)
+        # Runs the camera probes.
+        self.pool = futures.ThreadPoolExecutor(max_workers=MAX_SEARCH_CAMS)
         self.stop_flag = threading.Event()
         self.assign_done_flag = threading.Event()
-        self.frame_buffers = frame_buffers
+        self.frame_ring = frame_ring
+        self.preprocessor = utils.FramePreprocessor()
+        self.config_version = None
+        self.frame_shape = None
 
         # Open all cameras
         self.cameras = {}
 
-        self.assign_exe = Thread(target=utils.assign_cameras_queue,
-                                 args=(self.cameras, self.assign_done,
-                                       MAX_SEARCH_CAMS),
-                                 daemon=True)
+        self.preferred_id = None
+        # Last known-good camera device, None if not using camera devices.
+        self.camera_cache = None
+        # Camera to read, set by assign_done on the assign thread.
+        self.current_id = None
+
+        if not (App().cameraSources or App().replayPath):
+            self.camera_cache = utils.load_camera_cache(App().cameraCachePath)
+            first_ids = tuple(
+                cam_id for cam_id in (ConfigManager().config["camera_id"],
+                                      self.camera_cache.get("camera_id"))
+                if isinstance(cam_id, int))
+            self.assign_exe = Thread(target=utils.assign_cameras_queue,
+                                     args=(self.cameras, self.assign_done,
+                                           MAX_SEARCH_CAMS, self.pool,
+                                           first_ids),
+                                     daemon=True)
+        else:
+            self.assign_exe = Thread(target=self.assign_sources, daemon=True)
         self.assign_exe.start()
-        # Decide what camera to use
-        self.current_id = None  #ConfigManager().config["camera_id"]
-        logger.info(f"Found default camera_id {self.current_id}")
 
         self.loop_exe = Thread(target=self.read_camera_loop,
                                args=(self.stop_flag,),
@@ -179,6 +303,8 @@ class ThreadCameras():
         logger.info(f"Assign cameras completed. Found {self.cameras}")
 
         init_id = ConfigManager().config["camera_id"]
+        if self.preferred_id is not None:
+            init_id = self.preferred_id
 
         # pick first camera available if camera in config not found
         if not self.cameras:
@@ -187,7 +313,7 @@ class ThreadCameras():
         else:
             # Pick first camera available if camera in config not found
             if init_id not in self.cameras:
-                self.current_id = list(self.cameras.keys())[0]
+                self.current_id = min(self.cameras)
             else:
                 self.current_id = init_id
 
@@ -195,6 +321,31 @@ class ThreadCameras():
         self.pick_camera(self.current_id)
         self.assign_done_flag.set()
 
+    def assign_sources(self):
+        """Use the sources from the command line instead of camera devices.
+        A replayed session is picked first.
+        """
+        try:
+            sources = []
+            if App().replayPath is not None:
+                sources.append(
+                    SessionReplayer(App().replayPath,
+                                    realtime=App().replaySpeed == "realtime"))
+            for spec in App().cameraSources or ():
+                try:
+                    sources.append(utils.create_camera_source(spec))
+                except ValueError as e:
+                    logger.error(e)
+
+            for cam_id, source in enumerate(sources):
+                if source.open():
+                    self.cameras[cam_id] = source
+                    if self.preferred_id is None:
+                        self.preferred_id = cam_id
+        finally:
+            # The GUI waits for assign_done_flag.
+            self.assign_done()
+
     def pick_camera(self, new_id: int) -> None:
         """Open only one camera and release all others.
 
@@ -208,69 +359,79 @@ class ThreadCameras():
             logger.error(f"Camera {new_id} not found")
             return
 
-        for cam_id, _ in self.cameras.items():
+        # Copy because cameras can still be being added by the probes.
+        for cam_id, source in list(self.cameras.items()):
             if cam_id == new_id:
-                if self.cameras[new_id] is not None:
-                    continue
-                utils.open_camera(self.cameras, cam_id)
+                if not source.is_opened:
+                    utils.open_camera(self.cameras, cam_id)
             else:
-                if self.cameras[cam_id] is not None:
-                    self.cameras[cam_id].release()
-                self.cameras[cam_id] = None
+                source.release()
 
         self.current_id = new_id
 
     def release_all_cameras(self):
         if self.cameras is not None:
-            for cam_id, _ in self.cameras.items():
-                if self.cameras[cam_id] is not None:
-                    self.cameras[cam_id].release()
-                self.cameras[cam_id] = None
+            for source in list(self.cameras.values()):
+                source.release()
 
     def read_camera_loop(self, stop_flag) -> None:
         logger.info("ThreadCamera main_loop started.")
 
         while not stop_flag.is_set():
-            if self.current_id is None:
-                time.sleep(1)
-                continue
-
             if not self.assign_done_flag.is_set():
-                time.sleep(1)
+                self.assign_done_flag.wait(1)
                 continue
 
-            if (self.current_id in self.cameras) and (self.cameras[self.current_id]
-                                                   is not None):
-                ret, frame = self.cameras[self.current_id].read()
+            source = self.cameras.get(self.current_id)
+            if source is not None and source.is_opened:
+                read_start = time.perf_counter()
+                ret, frame = source.read()
+                timestamp = time.perf_counter()
                 cv2.waitKey(1)
                 if not ret:
                     logger.error("No frame returned")
                     time.sleep(1)
                     continue
+                StageTimings().record("camera_read", read_start, timestamp)
+                if SessionRecorder().is_recording:
+                    SessionRecorder().record_frame(frame, timestamp)
+                if self.camera_cache is not None:
+                    self.update_camera_cache(frame.shape)
             else:
                 time.sleep(1)
                 continue
 
+            if self.config_version != ConfigManager().config_version:
+                self.config_version = ConfigManager().config_version
+                self.frame_shape = (ConfigManager().config["fix_height"],
+                                    ConfigManager().config["fix_width"], 3)
+
             frame.flags.writeable = False
-            h, w, _ = frame.shape
-
-            # Trim image
-            if h != ConfigManager().config["fix_height"] or w != ConfigManager(
-            ).config["fix_width"]:
-                target_width = int(h * 4 / 3)
-                if w > target_width:
-                    trim_width = w - target_width
-                    trim_left = trim_width // 2
-                    trim_right = trim_width - trim_left
-                    frame = frame[:, trim_left:-trim_right, :]
-                frame = cv2.resize(frame,
-                                   (ConfigManager().config["fix_width"],
-                                    ConfigManager().config["fix_height"]))
-            frame = cv2.flip(frame, 1)
-            self.frame_buffers["raw"] = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            preprocess_start = time.perf_counter()
+            dst = self.frame_ring.get_write_buffer(self.frame_shape)
+            self.preprocessor.process(frame, dst)
+            self.frame_ring.commit(timestamp)
+            StageTimings().record("preprocess", preprocess_start)
 
         return
 
+    def update_camera_cache(self, frame_shape: tuple) -> None:
+        """Remember the current camera as the last known-good one."""
+        height, width = frame_shape[:2]
+        cache = self.camera_cache
+        if (cache.get("camera_id") == self.current_id
+                and cache.get("width") == width
+                and cache.get("height") == height):
+            return
+        logger.info(f"Camera {self.current_id} {width}x{height} is good")
+        self.camera_cache = {
+            "camera_id": self.current_id,
+            "width": width,
+            "height": height
+        }
+        utils.save_camera_cache(App().cameraCachePath, self.current_id,
+                                width, height)
+
     def leave(self):
         pass
 
@@ -279,10 +440,11 @@ class ThreadCameras():
         self.stop_flag.set()
         self.assign_exe.join()
         self.loop_exe.join()
+        self.pool.shutdown(wait=False, cancel_futures=True)
 
         # Release all cameras
         self.release_all_cameras()
-        self.frame_buffers = None
+        self.frame_ring = None
         self.cameras = None
 
         logger.info("ThreadCamera destroyed")
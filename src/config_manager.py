@@ -31,6 +31,14 @@ BACKUP_PROFILE = "default"
 
 logger = logging.getLogger("ConfigManager")
 
+
+def load_default_config() -> dict:
+    """Cursor config of the built-in default profile."""
+    with Path(App().builtInProfilesDirectory, BACKUP_PROFILE,
+              CURSOR_FILENAME).open() as file:
+        return json.load(file)
+
+
 class ConfigManager(metaclass=Singleton):
 
     def __init__(self):
@@ -50,6 +58,12 @@ class ConfigManager(metaclass=Singleton):
         self.throttle_time = 1.5
         self.config = None
 
+        # Incremented whenever the applied cursor config or the applied
+        # bindings change. Consumers cache values derived from them and
+        # rebuild only when the version they cached differs.
+        self.config_version = 0
+        self.bindings_version = 0
+
         # Load config
         self.currentProfileDirectory = None
         self.current_profile_name = tk.StringVar()
@@ -170,9 +184,10 @@ class ConfigManager(metaclass=Singleton):
                 logger.critical(f'Missing configuration file "{path}".')
             raise FileNotFoundError(missing)
 
-        # Load cursor config
+        # Load cursor config. Profiles copied by an earlier version lack the
+        # settings added since, which get their built-in default values.
         with cursorPath.open() as file:
-            self.config = json.load(file)
+            self.config = {**load_default_config(), **json.load(file)}
 
         # Load mouse bindings
         with mousePath.open() as file:
@@ -194,6 +209,18 @@ class ConfigManager(metaclass=Singleton):
         self.load_profile(name)
         with self.currentProfilePath.open("w") as file:
             json.dump({"default": name}, file)
+        self.publish_change(config=True, bindings=True)
+
+    def publish_change(self, config: bool = False, bindings: bool = False):
+        """Tell consumers that applied configuration has changed. Call after
+        the new values have been assigned.
+        """
+        if config:
+            self.config_version += 1
+        if bindings:
+            self.bindings_version += 1
+        logger.info(f"Config version {self.config_version}"
+                    f" bindings version {self.bindings_version}")
 
     # ------------------------------- BASIC CONFIG ------------------------------- #
 
@@ -213,6 +240,7 @@ class ConfigManager(metaclass=Singleton):
         self.config = copy.deepcopy(self.tempConfig)
         self.write_config_file()
         self.unsave_configs = False
+        self.publish_change(config=True)
 
     # ------------------------------ MOUSE BINDINGS CONFIG ----------------------------- #
 
@@ -248,6 +276,7 @@ class ConfigManager(metaclass=Singleton):
         self.mouse_bindings = copy.deepcopy(self.tempMouseBindings)
         self.write_mouse_bindings_file()
         self.unsave_mouse_bindings = False
+        self.publish_change(bindings=True)
 
     def write_mouse_bindings_file(self):
         mousePath = Path(self.currentProfileDirectory, MOUSE_FILENAME)
@@ -307,6 +336,7 @@ class ConfigManager(metaclass=Singleton):
         self.keyboard_bindings = copy.deepcopy(self.tempKeyboardBindings)
         self.write_keyboard_bindings_file()
         self.unsave_keyboard_bindings = False
+        self.publish_change(bindings=True)
 
     def write_keyboard_bindings_file(self):
         keyboardPath = Path(self.currentProfileDirectory, KEYBOARD_FILENAME)
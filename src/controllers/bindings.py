@@ -0,0 +1,287 @@
+"""\
+Trigger state machines of the Keybinder bindings.
+
+Each binding is compiled into a Binding of its trigger mode, which drives an
+actuator: a mouse button, a key or a meta action. The bindings of a tick are
+all updated with the same timestamp.
+"""
+import abc
+import math
+
+from src.controllers.input_sink import InputSink
+from src.utils.Trigger import Trigger
+
+
+class TriggerTiming:
+    """Timing settings shared by all bindings, in seconds. Updated by the
+    Keybinder when they change, without recompiling the bindings.
+    """
+
+    __slots__ = ("throttle", "hold_trigger", "rapid_interval")
+
+    def __init__(self):
+        self.throttle = 0.0
+        self.hold_trigger = 0.0
+        self.rapid_interval = 0.0
+
+
+class ButtonActuator:
+    __slots__ = ("sink", "button")
+
+    def __init__(self, sink: InputSink, button: str):
+        self.sink = sink
+        self.button = button
+
+    def down(self) -> None:
+        self.sink.mouse_down(self.button)
+
+    def up(self) -> None:
+        self.sink.mouse_up(self.button)
+
+    def tap(self) -> None:
+        self.sink.click(self.button)
+
+    def release(self) -> None:
+        self.sink.mouse_up(self.button)
+
+
+class KeyActuator:
+    __slots__ = ("sink", "key")
+
+    def __init__(self, sink: InputSink, key: str):
+        self.sink = sink
+        self.key = key
+
+    def down(self) -> None:
+        self.sink.key_down(self.key)
+
+    def up(self) -> None:
+        self.sink.key_up(self.key)
+
+    def tap(self) -> None:
+        self.sink.press(self.key)
+
+    def release(self) -> None:
+        self.sink.key_up(self.key)
+
+
+class MetaActuator:
+    """Runs a meta action when pressed. Releasing does nothing."""
+
+    __slots__ = ("action",)
+
+    def __init__(self, action):
+        self.action = action
+
+    def down(self) -> None:
+        self.action()
+
+    def up(self) -> None:
+        pass
+
+    def tap(self) -> None:
+        self.action()
+
+    def release(self) -> None:
+        pass
+
+
+class Binding(metaclass=abc.ABCMeta):
+    """State machine of one binding. Subclasses implement a trigger mode in
+    step().
+
+    Args:
+        device (str): mouse, keyboard or meta
+        shape_name (str): blendshape that triggers it
+        threshold (float): blendshape value above which it's pressed
+        dwell (float): seconds that the blendshape has to stay above
+            threshold before the binding is pressed, 0 for none
+        actuator: what it presses and releases
+        timing (TriggerTiming): shared timing settings
+        now (float): time.perf_counter() time
+    """
+
+    __slots__ = ("device", "shape_name", "threshold", "dwell", "dwell_start",
+                 "actuator", "timing", "active", "last_act_time")
+
+    def __init__(self, device: str, shape_name: str, threshold: float,
+                 dwell: float, actuator, timing: TriggerTiming, now: float):
+        self.device = device
+        self.shape_name = shape_name
+        self.threshold = threshold
+        self.dwell = dwell
+        # Detection time at which the blendshape went above threshold, None
+        # while it's below.
+        self.dwell_start = None
+        self.actuator = actuator
+        self.timing = timing
+        self.active = False
+        # Last time it was released. New bindings are throttled too.
+        self.last_act_time = now
+
+    def dwelling(self, val: float, timestamp: float) -> bool:
+        """Dwell timer, driven by the detection times of the blendshape
+        values so that it doesn't depend on the frame rate.
+
+        Args:
+            val (float): blendshape value
+            timestamp (float): capture time of the frame it was detected in
+
+        Returns:
+            bool: True while the value has been above threshold for less than
+                the dwell time
+        """
+        if val > self.threshold:
+            if self.dwell_start is None:
+                self.dwell_start = timestamp
+            return timestamp - self.dwell_start < self.dwell
+        self.dwell_start = None
+        return False
+
+    def reset_dwell(self) -> None:
+        self.dwell_start = None
+
+    def update(self, val: float, now: float) -> None:
+        """Take the blendshape value of a tick, unless still throttled since
+        the last release.
+        """
+        if self.last_act_time > now - self.timing.throttle:
+            return
+        self.step(val, now)
+
+    @abc.abstractmethod
+    def step(self, val: float, now: float) -> None:
+        pass
+
+    def engaged(self) -> bool:
+        """True if it isn't idle, and has to be updated even below
+        threshold, for example to release a held key.
+        """
+        return self.active
+
+
+class SingleBinding(Binding):
+    """Tap once when pressed."""
+
+    __slots__ = ()
+
+    def step(self, val, now):
+        if val > self.threshold:
+            if not self.active:
+                self.actuator.tap()
+                self.active = True
+                self.last_act_time = now
+        if val < self.threshold:
+            self.active = False
+
+
+class HoldBinding(Binding):
+    """Hold down while pressed."""
+
+    __slots__ = ()
+
+    def step(self, val, now):
+        if val > self.threshold and not self.active:
+            self.actuator.down()
+            self.active = True
+        elif val < self.threshold and self.active:
+            self.actuator.up()
+            self.active = False
+            self.last_act_time = now
+
+
+class DynamicBinding(Binding):
+    """Tap when pressed, and hold down once pressed for longer than the
+    hold trigger time.
+    """
+
+    __slots__ = ("start_hold_ts", "holding")
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.start_hold_ts = math.inf
+        self.holding = False
+
+    def step(self, val, now):
+        if val > self.threshold:
+            if not self.active:
+                self.actuator.tap()
+                self.start_hold_ts = now
+                self.active = True
+            if (not self.holding and now - self.start_hold_ts
+                    >= self.timing.hold_trigger):
+                self.actuator.down()
+                self.holding = True
+        elif val < self.threshold and self.active:
+            self.active = False
+            if self.holding:
+                self.actuator.up()
+                self.holding = False
+                self.start_hold_ts = math.inf
+            self.last_act_time = now
+
+    def engaged(self):
+        return self.active or self.holding
+
+
+class ToggleBinding(Binding):
+    """Hold down when pressed, and release when pressed again."""
+
+    __slots__ = ("schedule_toggle_on", "schedule_toggle_off")
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.schedule_toggle_on = True
+        self.schedule_toggle_off = False
+
+    def step(self, val, now):
+        if val > self.threshold:
+            if not self.active and self.schedule_toggle_on:
+                self.actuator.down()
+                self.active = True
+            if self.active and self.schedule_toggle_off:
+                self.actuator.up()
+                self.active = False
+                self.last_act_time = now
+        if val < self.threshold:
+            self.schedule_toggle_off = self.active
+            self.schedule_toggle_on = not self.active
+
+    def engaged(self):
+        return (self.active or not self.schedule_toggle_on
+                or self.schedule_toggle_off)
+
+
+class RapidBinding(Binding):
+    """Tap when pressed, and again every rapid fire interval while
+    pressed.
+    """
+
+    __slots__ = ("start_hold_ts",)
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.start_hold_ts = math.inf
+
+    def step(self, val, now):
+        if val > self.threshold:
+            if not self.active:
+                self.actuator.tap()
+                self.active = True
+                self.start_hold_ts = now
+            if now - self.start_hold_ts >= self.timing.rapid_interval:
+                self.actuator.tap()
+                self.start_hold_ts = now
+        if val < self.threshold and self.active:
+            self.active = False
+            self.start_hold_ts = math.inf
+            self.last_act_time = now
+
+
+TRIGGER_BINDINGS = {
+    Trigger.SINGLE: SingleBinding,
+    Trigger.HOLD: HoldBinding,
+    Trigger.DYNAMIC: DynamicBinding,
+    Trigger.TOGGLE: ToggleBinding,
+    Trigger.RAPID: RapidBinding,
+}
@@ -0,0 +1,439 @@
+"""\
+Input injection backends.
+
+The controllers queue the input events of a tick on an InputSink and submit
+them together with flush(). Events are submitted in the order they were
+queued, and consecutive pointer moves are merged into one.
+"""
+import abc
+import ctypes
+import importlib.util
+import logging
+import os
+import platform
+import time
+from ctypes import wintypes
+
+logger = logging.getLogger("InputSink")
+
+# Event kinds. Each queued event is a (kind, a, b) tuple.
+#
+# Pointer move by (dx, dy) pixels. Fractions are truncated when submitted, as
+# pyautogui does.
+MOVE = "move"
+# Pointer move to (x, y) in screen pixels.
+MOVE_TO = "move_to"
+# Mouse button (button, None), button being left, middle or right.
+MOUSE_DOWN = "mouse_down"
+MOUSE_UP = "mouse_up"
+# Key (key, None), key being a pydirectinput key name.
+KEY_DOWN = "key_down"
+KEY_UP = "key_up"
+
+# Screen size reported by RecordingSink.
+RECORDING_SCREEN_SIZE = (1920, 1080)
+
+
+class InputSink(metaclass=abc.ABCMeta):
+    """Queue of input events, submitted by flush(). Each controller has its
+    own sink and uses it from one thread.
+    """
+
+    def __init__(self):
+        self.queue = []
+
+    def move(self, dx: float, dy: float) -> None:
+        if self.queue and self.queue[-1][0] in (MOVE, MOVE_TO):
+            kind, a, b = self.queue[-1]
+            self.queue[-1] = (kind, a + dx, b + dy)
+        else:
+            self.queue.append((MOVE, dx, dy))
+
+    def move_to(self, x: int, y: int) -> None:
+        if self.queue and self.queue[-1][0] in (MOVE, MOVE_TO):
+            self.queue[-1] = (MOVE_TO, x, y)
+        else:
+            self.queue.append((MOVE_TO, x, y))
+
+    def mouse_down(self, button: str) -> None:
+        self.queue.append((MOUSE_DOWN, button, None))
+
+    def mouse_up(self, button: str) -> None:
+        self.queue.append((MOUSE_UP, button, None))
+
+    def click(self, button: str) -> None:
+        self.mouse_down(button)
+        self.mouse_up(button)
+
+    def key_down(self, key: str) -> None:
+        self.queue.append((KEY_DOWN, key, None))
+
+    def key_up(self, key: str) -> None:
+        self.queue.append((KEY_UP, key, None))
+
+    def press(self, key: str) -> None:
+        self.key_down(key)
+        self.key_up(key)
+
+    def flush(self) -> list[tuple]:
+        """Submit the queued events.
+
+        Returns:
+            list: the events submitted
+        """
+        events = self.queue
+        if not events:
+            return events
+        self.queue = []
+        self.submit(events)
+        return events
+
+    @abc.abstractmethod
+    def submit(self, events: list[tuple]) -> None:
+        pass
+
+    @abc.abstractmethod
+    def position(self) -> tuple[int, int]:
+        """Pointer position in screen pixels."""
+        pass
+
+    @abc.abstractmethod
+    def size(self) -> tuple[int, int]:
+        """Primary screen size in pixels."""
+        pass
+
+
+class PyAutoGUISink(InputSink):
+    """One library call per event: pyautogui for pointer moves, and
+    pydirectinput for everything else where it's available. This is how
+    input was injected before there were sinks.
+    """
+
+    def __init__(self):
+        super().__init__()
+        import pyautogui
+        pyautogui.PAUSE = 0
+        pyautogui.FAILSAFE = False
+        try:
+            import pydirectinput
+        except ImportError:
+            # pydirectinput is Windows only, and pyautogui has the same
+            # functions.
+            pydirectinput = pyautogui
+        pydirectinput.PAUSE = 0
+        pydirectinput.FAILSAFE = False
+        self.pyautogui = pyautogui
+        self.pydirectinput = pydirectinput
+
+    def submit(self, events: list[tuple]) -> None:
+        for kind, a, b in events:
+            if kind == MOVE:
+                # pydirectinput is not working here
+                self.pyautogui.move(xOffset=a, yOffset=b)
+            elif kind == MOVE_TO:
+                self.pydirectinput.moveTo(a, b)
+            elif kind == MOUSE_DOWN:
+                self.pydirectinput.mouseDown(button=a)
+            elif kind == MOUSE_UP:
+                self.pydirectinput.mouseUp(button=a)
+            elif kind == KEY_DOWN:
+                self.pydirectinput.keyDown(key=a)
+            elif kind == KEY_UP:
+                self.pydirectinput.keyUp(key=a)
+
+    def position(self) -> tuple[int, int]:
+        return self.pydirectinput.position()
+
+    def size(self) -> tuple[int, int]:
+        return self.pydirectinput.size()
+
+
+# SendInput structures and flags.
+# https://learn.microsoft.com/windows/win32/api/winuser/ns-winuser-input
+class MOUSEINPUT(ctypes.Structure):
+    _fields_ = [("dx", wintypes.LONG), ("dy", wintypes.LONG),
+                ("mouseData", wintypes.DWORD), ("dwFlags", wintypes.DWORD),
+                ("time", wintypes.DWORD), ("dwExtraInfo", ctypes.c_size_t)]
+
+
+class KEYBDINPUT(ctypes.Structure):
+    _fields_ = [("wVk", wintypes.WORD), ("wScan", wintypes.WORD),
+                ("dwFlags", wintypes.DWORD), ("time", wintypes.DWORD),
+                ("dwExtraInfo", ctypes.c_size_t)]
+
+
+class HARDWAREINPUT(ctypes.Structure):
+    _fields_ = [("uMsg", wintypes.DWORD), ("wParamL", wintypes.WORD),
+                ("wParamH", wintypes.WORD)]
+
+
+class INPUT_UNION(ctypes.Union):
+    _fields_ = [("mi", MOUSEINPUT), ("ki", KEYBDINPUT),
+                ("hi", HARDWAREINPUT)]
+
+
+class INPUT(ctypes.Structure):
+    _fields_ = [("type", wintypes.DWORD), ("union", INPUT_UNION)]
+
+
+INPUT_MOUSE = 0
+INPUT_KEYBOARD = 1
+MOUSEEVENTF_MOVE = 0x0001
+MOUSEEVENTF_VIRTUALDESK = 0x4000
+MOUSEEVENTF_ABSOLUTE = 0x8000
+MOUSE_BUTTON_FLAGS = {
+    # Down and up flags.
+    "left": (0x0002, 0x0004),
+    "right": (0x0008, 0x0010),
+    "middle": (0x0020, 0x0040),
+}
+KEYEVENTF_EXTENDEDKEY = 0x0001
+KEYEVENTF_KEYUP = 0x0002
+KEYEVENTF_SCANCODE = 0x0008
+SM_CXSCREEN = 0
+SM_CYSCREEN = 1
+SM_XVIRTUALSCREEN = 76
+SM_YVIRTUALSCREEN = 77
+SM_CXVIRTUALSCREEN = 78
+SM_CYVIRTUALSCREEN = 79
+ARROW_KEYS = ("up", "down", "left", "right")
+
+
+class SendInputSink(InputSink):
+    """Submits all the events of a flush in one Windows SendInput call, with
+    the same key scan codes as pydirectinput.
+
+    Pointer moves are sent as absolute positions on the virtual desktop,
+    like pyautogui's relative moves, so that they aren't changed by the
+    Windows pointer speed and acceleration settings.
+    """
+
+    def __init__(self):
+        super().__init__()
+        import pydirectinput
+        self.user32 = ctypes.windll.user32
+        self.key_mapping = pydirectinput.KEYBOARD_MAPPING
+
+    def key_input(self, key: str, flags: int) -> INPUT | None:
+        code = self.key_mapping.get(key)
+        if code is None:
+            logger.warning(f'No scan code for key "{key}"')
+            return None
+        # pydirectinput's codes for extended keys are DirectInput codes, with
+        # the high bit set, plus 1024 for some.
+        if code & ~0x7F or key in ARROW_KEYS:
+            flags |= KEYEVENTF_EXTENDEDKEY
+        event = INPUT(type=INPUT_KEYBOARD)
+        event.union.ki = KEYBDINPUT(0, code & 0x7F,
+                                    flags | KEYEVENTF_SCANCODE, 0, 0)
+        return event
+
+    def submit(self, events: list[tuple]) -> None:
+        metrics = self.user32.GetSystemMetrics
+        left = metrics(SM_XVIRTUALSCREEN)
+        top = metrics(SM_YVIRTUALSCREEN)
+        width = max(metrics(SM_CXVIRTUALSCREEN) - 1, 1)
+        height = max(metrics(SM_CYVIRTUALSCREEN) - 1, 1)
+        x = y = None
+
+        inputs = []
+        for kind, a, b in events:
+            if kind in (MOVE, MOVE_TO):
+                if kind == MOVE_TO:
+                    x, y = int(a), int(b)
+                else:
+                    if x is None:
+                        x, y = self.position()
+                    x += int(a)
+                    y += int(b)
+                event = INPUT(type=INPUT_MOUSE)
+                event.union.mi = MOUSEINPUT(
+                    round((x - left) * 65535 / width),
+                    round((y - top) * 65535 / height), 0,
+                    MOUSEEVENTF_MOVE | MOUSEEVENTF_ABSOLUTE
+                    | MOUSEEVENTF_VIRTUALDESK, 0, 0)
+            elif kind in (MOUSE_DOWN, MOUSE_UP):
+                down, up = MOUSE_BUTTON_FLAGS[a]
+                event = INPUT(type=INPUT_MOUSE)
+                event.union.mi = MOUSEINPUT(0, 0, 0,
+                                            down if kind == MOUSE_DOWN else up,
+                                            0, 0)
+            elif kind == KEY_DOWN:
+                event = self.key_input(a, 0)
+            else:
+                event = self.key_input(a, KEYEVENTF_KEYUP)
+            if event is not None:
+                inputs.append(event)
+
+        if inputs:
+            array = (INPUT * len(inputs))(*inputs)
+            sent = self.user32.SendInput(len(inputs), array,
+                                         ctypes.sizeof(INPUT))
+            if sent != len(inputs):
+                logger.warning(f"SendInput sent {sent} of {len(inputs)}"
+                               " events")
+
+    def position(self) -> tuple[int, int]:
+        point = wintypes.POINT()
+        self.user32.GetCursorPos(ctypes.byref(point))
+        return point.x, point.y
+
+    def size(self) -> tuple[int, int]:
+        return (self.user32.GetSystemMetrics(SM_CXSCREEN),
+                self.user32.GetSystemMetrics(SM_CYSCREEN))
+
+
+# X keysym names of pydirectinput key names that aren't the same, ignoring
+# case.
+X_KEYSYM_NAMES = {
+    "enter": "Return",
+    "esc": "Escape",
+    "pageup": "Prior",
+    "pagedown": "Next",
+    "win": "Super_L",
+    "winleft": "Super_L",
+    "winright": "Super_R",
+    "capslock": "Caps_Lock",
+    "numlock": "Num_Lock",
+    "shift": "Shift_L",
+    "shiftleft": "Shift_L",
+    "shiftright": "Shift_R",
+    "ctrl": "Control_L",
+    "ctrlleft": "Control_L",
+    "ctrlright": "Control_R",
+    "alt": "Alt_L",
+    "altleft": "Alt_L",
+    "altright": "Alt_R",
+    "backspace": "BackSpace",
+    "del": "Delete",
+}
+X_BUTTONS = {"left": 1, "middle": 2, "right": 3}
+
+
+class XTestSink(InputSink):
+    """Submits the events of a flush with the X11 XTEST extension, in one
+    round trip to the X server. Needs the optional python-xlib package.
+    """
+
+    def __init__(self):
+        super().__init__()
+        from Xlib import X, XK, display
+        from Xlib.ext import xtest
+        self.X = X
+        self.XK = XK
+        self.xtest = xtest
+        self.display = display.Display()
+        self.root = self.display.screen().root
+        self.keycodes = {}
+
+    def keycode(self, key: str) -> int:
+        keycode = self.keycodes.get(key)
+        if keycode is None:
+            if len(key) == 1:
+                # Latin-1 keysyms are the same as the characters.
+                keysym = ord(key)
+            else:
+                name = X_KEYSYM_NAMES.get(key, key)
+                keysym = (self.XK.string_to_keysym(name)
+                          or self.XK.string_to_keysym(name.title()))
+            keycode = self.display.keysym_to_keycode(keysym)
+            if keycode == 0:
+                logger.warning(f'No key code for key "{key}"')
+            self.keycodes[key] = keycode
+        return keycode
+
+    def submit(self, events: list[tuple]) -> None:
+        X = self.X
+        fake_input = self.xtest.fake_input
+        for kind, a, b in events:
+            if kind == MOVE:
+                fake_input(self.display, X.MotionNotify, detail=True,
+                           x=int(a), y=int(b))
+            elif kind == MOVE_TO:
+                fake_input(self.display, X.MotionNotify, x=int(a), y=int(b))
+            elif kind == MOUSE_DOWN:
+                fake_input(self.display, X.ButtonPress, X_BUTTONS[a])
+            elif kind == MOUSE_UP:
+                fake_input(self.display, X.ButtonRelease, X_BUTTONS[a])
+            else:
+                keycode = self.keycode(a)
+                if keycode:
+                    fake_input(self.display,
+                               X.KeyPress if kind == KEY_DOWN else
+                               X.KeyRelease, keycode)
+        self.display.sync()
+
+    def position(self) -> tuple[int, int]:
+        pointer = self.root.query_pointer()
+        return pointer.root_x, pointer.root_y
+
+    def size(self) -> tuple[int, int]:
+        screen = self.display.screen()
+        return screen.width_in_pixels, screen.height_in_pixels
+
+
+class RecordingSink(InputSink):
+    """Records submitted events instead of injecting them, for benchmarks and
+    tests. Keeps track of where the pointer would be.
+    """
+
+    def __init__(self, screen_size: tuple[int, int] = RECORDING_SCREEN_SIZE):
+        super().__init__()
+        self.screen_size = screen_size
+        self.pointer = (screen_size[0] // 2, screen_size[1] // 2)
+        # perf_counter time, kind, a and b of each submitted event.
+        self.events = []
+        self.n_submits = 0
+
+    def submit(self, events: list[tuple]) -> None:
+        now = time.perf_counter()
+        for kind, a, b in events:
+            if kind == MOVE:
+                self.pointer = (self.pointer[0] + int(a),
+                                self.pointer[1] + int(b))
+            elif kind == MOVE_TO:
+                self.pointer = (int(a), int(b))
+            self.events.append((now, kind, a, b))
+        self.n_submits += 1
+
+    def position(self) -> tuple[int, int]:
+        return self.pointer
+
+    def size(self) -> tuple[int, int]:
+        return self.screen_size
+
+
+INPUT_SINKS = {
+    "sendinput": SendInputSink,
+    "xtest": XTestSink,
+    "pyautogui": PyAutoGUISink,
+    "recording": RecordingSink,
+}
+
+
+def create_input_sink(backend: str) -> InputSink:
+    """
+    Args:
+        backend (str): auto, sendinput, xtest, pyautogui or recording. auto
+            is sendinput on Windows, xtest on X11 if python-xlib is
+            installed, and pyautogui otherwise.
+
+    Raises:
+        ValueError: if backend isn't one of those
+        ImportError, OSError: if the backend isn't available here
+    """
+    if backend == "auto":
+        if platform.system() == "Windows":
+            backend = "sendinput"
+        elif (os.environ.get("DISPLAY")
+              and importlib.util.find_spec("Xlib") is not None):
+            backend = "xtest"
+        else:
+            backend = "pyautogui"
+    try:
+        sink_class = INPUT_SINKS[backend]
+    except KeyError:
+        raise ValueError(f'Unknown input backend "{backend}".'
+                         f' Expected auto or one of {", ".join(INPUT_SINKS)}.')
+    logger.info(f"Using {backend} input backend")
+    return sink_class()
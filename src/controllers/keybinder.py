@@ -1,76 +1,177 @@
-import copy
 import logging
-import math
+import threading
 import time
 
-import pydirectinput
+import numpy as np
 import win32api
 import tkinter as tk
 
 import src.shape_list as shape_list
 from src.config_manager import ConfigManager
+from src.controllers.bindings import (TRIGGER_BINDINGS, ButtonActuator,
+                                      HoldBinding, KeyActuator, MetaActuator,
+                                      TriggerTiming)
+from src.controllers.input_sink import create_input_sink
 from src.singleton_meta import Singleton
+from src.stage_timings import StageTimings
 from src.utils.Trigger import Trigger
 
 logger = logging.getLogger("Keybinder")
 
-# disable lag
-pydirectinput.PAUSE = 0
-pydirectinput.FAILSAFE = False
+# Shortest hold time of blink bindings, in seconds.
+MIN_BLINK_DWELL = 0.01
 
 
 class Keybinder(metaclass=Singleton):
 
     def __init__(self) -> None:
         self.delay_count = None
-        self.key_states = None
-        self.last_act_time = None
-        self.schedule_toggle_off = {}
-        self.schedule_toggle_on = {}
         self.monitors = None
         self.screen_h = None
         self.screen_w = None
         logger.info("Initialize Keybinder singleton")
         self.top_count = 0
-        self.blink_count = 0
-        self.start_hold_ts = {} 
-        self.holding = {}
         self.is_started = False
-        self.last_know_keybindings = {}
+        self.bindings_version = None
+        self.config_version = None
+        self.timing = TriggerTiming()
+        # Actuator of each device and action, shared by the bindings of the
+        # same mouse button, key or meta action.
+        self.actuators = {}
+        self.bindings = []
+        self.binding_indices = np.zeros(0, np.intp)
+        self.binding_thresholds = np.zeros(0)
+        self.binding_always_on = np.zeros(0, bool)
+        self.binding_engaged = np.zeros(0, bool)
         self.is_active = None
+        self.active_flag = False
+        # Thread that owns the Tk variables, the one that started the
+        # Keybinder.
+        self.tk_thread = None
+        # active_flag in the previous act() call.
+        self.was_active = False
+        # Inputs of an act() call are queued on the sink and injected
+        # together at the end of the call.
+        self.sink = None
+        # Capture time of the frame that the current act() call is for.
+        self.frame_timestamp = None
 
     def start(self):
         if not self.is_started:
             logger.info("Start Keybinder singleton")
+            try:
+                self.sink = create_input_sink(
+                    ConfigManager().config["input_backend"])
+            except (ValueError, ImportError, OSError) as e:
+                logger.error(e)
+                self.sink = create_input_sink("pyautogui")
             self.init_states()
-            self.screen_w, self.screen_h = pydirectinput.size()
+            self.screen_w, self.screen_h = self.sink.size()
             self.monitors = self.get_monitors()
+            self.tk_thread = threading.current_thread()
             self.is_started = True
 
             self.is_active = tk.BooleanVar()
             self.is_active.set(ConfigManager().config["auto_play"])
+            # Plain copy of is_active for the pipeline thread. Reading a Tk
+            # variable from another thread waits for the Tk event loop.
+            self.active_flag = self.is_active.get()
+            self.is_active.trace_add("write", self.on_active_changed)
+
+    def on_active_changed(self, *args):
+        self.active_flag = self.is_active.get()
+
+    def sync_active_var(self) -> None:
+        """Copy active_flag to the Tk variable, if it was changed from
+        another thread. Called by the Tk event loop.
+        """
+        if self.is_active is not None and (self.is_active.get()
+                                           != self.active_flag):
+            self.is_active.set(self.active_flag)
 
     def init_states(self) -> None:
         """Re-initializes the state of the keybinder.
            If new keybindings are added.
         """
-        # keep states for all registered keys.
-        self.key_states = {}
-        self.last_act_time = {}
-        self.start_hold_ts = {}
-        for _, v in (ConfigManager().mouse_bindings |
-                     ConfigManager().keyboard_bindings).items():
-            state_name = v[0]+"_"+v[1]
-            self.key_states[state_name] = False
-            self.last_act_time[state_name] = int(time.time() * 1000)
-            self.schedule_toggle_off[state_name] = False
-            self.schedule_toggle_on[state_name] = True
-            self.start_hold_ts[state_name] = math.inf
-            self.holding[state_name] = False
-
-        self.last_know_keybindings = copy.deepcopy(
-            (ConfigManager().mouse_bindings |
-             ConfigManager().keyboard_bindings))
+        self.bindings_version = ConfigManager().bindings_version
+        self.load_config()
+        self.compile_bindings(ConfigManager().mouse_bindings |
+                              ConfigManager().keyboard_bindings)
+
+    def load_config(self) -> None:
+        """Update the trigger timing settings shared by the bindings."""
+        self.config_version = ConfigManager().config_version
+        config = ConfigManager().config
+        self.timing.hold_trigger = config["hold_trigger_ms"] / 1000
+        self.timing.rapid_interval = config["rapid_fire_interval_ms"] / 1000
+
+    def get_actuator(self, device: str, action: str):
+        """Actuator of a device and action, None if the action is unknown.
+
+        Meta actions run in act(), on the pipeline thread, so they mustn't
+        touch Tk. Pause only sets active_flag there, see set_active(), and
+        reset and cycle only queue pointer moves on the sink.
+        """
+        actuator = self.actuators.get((device, action))
+        if actuator is None:
+            if device == "mouse":
+                actuator = ButtonActuator(self.sink, action)
+            elif device == "keyboard":
+                actuator = KeyActuator(self.sink, action)
+            elif action == "pause":
+                actuator = MetaActuator(self.toggle_active)
+            elif action == "reset":
+                actuator = MetaActuator(self.reset_pointer)
+            elif action == "cycle":
+                actuator = MetaActuator(self.cycle_pointer)
+            else:
+                return None
+            self.actuators[(device, action)] = actuator
+        return actuator
+
+    def compile_bindings(self, bindings: dict) -> None:
+        """Compile bindings into state machines, and into arrays so that
+        act() can find the ones to dispatch with one vectorized comparison
+        per frame.
+
+        Args:
+            bindings (dict): shape name to [device, action, threshold, mode,
+                time_threshold]
+        """
+        now = time.perf_counter()
+        indices = []
+        thresholds = []
+        always_on = []
+        self.bindings = []
+        for shape_name, v in bindings.items():
+            if shape_name not in shape_list.blendshape_names:
+                continue
+            device, action, threshold, mode, time_threshold = v
+            actuator = self.get_actuator(device, action)
+            if actuator is None:
+                logger.warning(f"Unknown {device} action {action}")
+                continue
+            # Meta actions run once when pressed, whatever the mode.
+            binding_class = (HoldBinding if device == "meta" else
+                             TRIGGER_BINDINGS[Trigger(mode.lower())])
+            # Blinks have to be held for time_threshold seconds, so that
+            # normal blinking doesn't trigger them.
+            dwell = (max(time_threshold, MIN_BLINK_DWELL)
+                     if device != "meta" and "blink" in shape_name else 0.0)
+            self.bindings.append(
+                binding_class(device, shape_name, threshold, dwell, actuator,
+                              self.timing, now))
+            indices.append(shape_list.blendshape_indices[shape_name])
+            thresholds.append(threshold)
+            # Pause has to work while inactive, to reactivate.
+            always_on.append(device == "meta" and action == "pause")
+
+        self.binding_indices = np.array(indices, np.intp)
+        self.binding_thresholds = np.array(thresholds, np.float64)
+        self.binding_always_on = np.array(always_on, bool)
+        # Bindings that aren't in their idle state and have to be dispatched
+        # even below threshold, for example to release a held key.
+        self.binding_engaged = np.zeros(len(indices), bool)
 
     def get_monitors(self) -> list[dict]:
         out_list = []
@@ -90,7 +191,7 @@ class Keybinder(metaclass=Singleton):
 
     def get_current_monitor(self) -> int:
 
-        x, y = pydirectinput.position()
+        x, y = self.sink.position()
         for mon_id, mon in enumerate(self.monitors):
             if x >= mon["x1"] and x <= mon["x2"] and y >= mon[
                 "y1"] and y <= mon["y2"]:
@@ -98,239 +199,35 @@ class Keybinder(metaclass=Singleton):
         # raise Exception("Monitor not found")
         return 0
 
-    def meta_action(self, val, action, threshold, is_active: bool) -> None:
-        state_name = "meta_" + action
-
-        if self.last_act_time[state_name] > int(time.time() * 1000) - ConfigManager().get_throttle_time() * 1000:
-            return
-        if action == "pause":
-
-            if (val > threshold) and (self.key_states[state_name] is False):
-                mon_id = self.get_current_monitor()
-                if mon_id is None:
-                    return
-
-                self.toggle_active()
-
-                self.key_states[state_name] = True
-            elif (val < threshold) and (self.key_states[state_name] is True):
-                self.key_states[state_name] = False
-                self.last_act_time[state_name] = int(time.time() * 1000)
-
-        if is_active:
-
-            if action == "reset":
-                if (val > threshold) and (self.key_states[state_name] is
-                                      False):
-                    mon_id = self.get_current_monitor()
-                    if mon_id is None:
-                        return
-
-                    pydirectinput.moveTo(
-                        self.monitors[mon_id]["center_x"],
-                        self.monitors[mon_id]["center_y"])
-                    self.key_states[state_name] = True
-                elif (val < threshold) and (self.key_states[state_name] is
-                                        True):
-                    self.key_states[state_name] = False
-                    self.last_act_time[state_name] = int(time.time() * 1000)
-
-            elif action == "cycle":
-                if (val > threshold) and (self.key_states[state_name] is
-                                      False):
-                    mon_id = self.get_current_monitor()
-                    next_mon_id = (mon_id + 1) % len(self.monitors)
-                    pydirectinput.moveTo(
-                        self.monitors[next_mon_id]["center_x"],
-                        self.monitors[next_mon_id]["center_y"])
-                    self.key_states[state_name] = True
-                elif (val < threshold) and (self.key_states[state_name] is
-                                        True):
-                    self.key_states[state_name] = False
-                    self.last_act_time[state_name] = int(time.time() * 1000)
-
-    def mouse_action(self, val, action, threshold, mode) -> None:
-        state_name = "mouse_" + action
-
-        if self.last_act_time[state_name] > int(time.time() * 1000) - ConfigManager().get_throttle_time() * 1000:
-            return
-        if mode == Trigger.SINGLE:
-            if val > threshold:
-                if self.key_states[state_name] is False:
-                    pydirectinput.click(button=action)
-                    self.key_states[state_name] = True
-                    self.last_act_time[state_name] = int(time.time() * 1000)
-            if val < threshold:
-                self.key_states[state_name] = False
-
-        elif mode == Trigger.HOLD:
-            if (val > threshold) and (self.key_states[state_name] is False):
-                pydirectinput.mouseDown(button=action)
-                self.key_states[state_name] = True
-
-            elif (val < threshold) and (self.key_states[state_name] is True):
-                pydirectinput.mouseUp(button=action)
-                self.key_states[state_name] = False
-                self.last_act_time[state_name] = int(time.time() * 1000)
-
-        elif mode == Trigger.DYNAMIC:
-            if val > threshold:
-                if self.key_states[state_name] is False:
-                    pydirectinput.click(button=action)
-                    self.start_hold_ts[state_name] = time.time()
-                    self.key_states[state_name] = True
-
-                if self.holding[state_name] is False and (
-                        ((time.time() - self.start_hold_ts[state_name]) * 1000) >=
-                        ConfigManager().config["hold_trigger_ms"]):
-                    pydirectinput.mouseDown(button=action)
-                    self.holding[state_name] = True
-
-            elif (val < threshold) and (self.key_states[state_name] is True):
-
-                self.key_states[state_name] = False
-                self.last_act_time[state_name] = int(time.time() * 1000)
-                if self.holding[state_name]:
-                    pydirectinput.mouseUp(button=action)
-                    self.holding[state_name] = False
-                    self.start_hold_ts[state_name] = math.inf
-                self.last_act_time[state_name] = int(time.time() * 1000)
-
-        elif mode == Trigger.TOGGLE:
-            if val > threshold:
-                if self.key_states[state_name] is False:
-                    if self.schedule_toggle_on[state_name] is True:
-                        pydirectinput.mouseDown(button=action)
-                        self.key_states[state_name] = True
-
-                if self.key_states[state_name] is True:
-                    if self.schedule_toggle_off[state_name] is True:
-                        pydirectinput.mouseUp(button=action)
-                        self.key_states[state_name] = False
-                        self.last_act_time[state_name] = int(time.time() * 1000)
-
-            if val < threshold:
-                if self.key_states[state_name] is True:
-                    self.schedule_toggle_off[state_name] = True
-                    self.schedule_toggle_on[state_name] = False
-                if self.key_states[state_name] is False:
-                    self.schedule_toggle_on[state_name] = True
-                    self.schedule_toggle_off[state_name] = False
-
-        elif mode == Trigger.RAPID:
-            if val > threshold:
-                if self.key_states[state_name] is False:
-                    pydirectinput.click(button=action)
-                    self.key_states[state_name] = True
-                    self.start_hold_ts[state_name] = time.time()
-
-                if self.key_states[state_name] is True:
-                    if (((time.time() - self.start_hold_ts[state_name]) * 1000)
-                            >= ConfigManager().config["rapid_fire_interval_ms"]):
-                        pydirectinput.click(button=action)
-                        self.holding[state_name] = True
-                        self.start_hold_ts[state_name] = time.time()
-
-            if val < threshold:
-                if self.key_states[state_name] is True:
-                    self.key_states[state_name] = False
-                    self.start_hold_ts[state_name] = math.inf
-                    self.last_act_time[state_name] = int(time.time() * 1000)
-
-    def keyboard_action(self, val, keysym, threshold, mode):
-
-        state_name = "keyboard_" + keysym
-
-        if self.last_act_time[state_name] > int(time.time() * 1000) - ConfigManager().get_throttle_time() * 1000:
-            return
-        if mode == Trigger.SINGLE:
-            if val > threshold:
-                if self.key_states[state_name] is False:
-                    pydirectinput.press(keys=keysym)
-                    self.key_states[state_name] = True
-                    self.last_act_time[state_name] = int(time.time() * 1000)
-            if val < threshold:
-                self.key_states[state_name] = False
-
-        elif mode == Trigger.HOLD:
-            if (val > threshold) and (self.key_states[state_name] is False):
-                pydirectinput.keyDown(key=keysym)
-                self.key_states[state_name] = True
-
-            elif (val < threshold) and (self.key_states[state_name] is True):
-                pydirectinput.keyUp(key=keysym)
-                self.key_states[state_name] = False
-                self.last_act_time[state_name] = int(time.time() * 1000)
-
-        elif mode == Trigger.DYNAMIC:
-            if val > threshold:
-                if self.key_states[state_name] is False:
-                    pydirectinput.press(keys=keysym)
-                    self.start_hold_ts[state_name] = time.time()
-                    self.key_states[state_name] = True
-
-                if self.holding[state_name] is False and (
-                        ((time.time() - self.start_hold_ts[state_name]) * 1000) >=
-                        ConfigManager().config["hold_trigger_ms"]):
-                    pydirectinput.keyDown(key=keysym)
-                    self.holding[state_name] = True
-
-            elif (val < threshold) and (self.key_states[state_name] is True):
-
-                self.key_states[state_name] = False
-
-                if self.holding[state_name]:
-                    pydirectinput.keyUp(key=keysym)
-                    self.holding[state_name] = False
-                    self.start_hold_ts[state_name] = math.inf    
-                self.last_act_time[state_name] = int(time.time() * 1000)
-
-        elif mode == Trigger.TOGGLE:
-            if val > threshold:
-                if self.key_states[state_name] is False:
-                    if self.schedule_toggle_on[state_name] is True:
-                        pydirectinput.keyDown(key=keysym)
-                        self.key_states[state_name] = True
-
-                if self.key_states[state_name] is True:
-                    if self.schedule_toggle_off[state_name] is True:
-                        pydirectinput.keyUp(key=keysym)
-                        self.key_states[state_name] = False
-                        self.last_act_time[state_name] = int(time.time() * 1000)
-
-            if val < threshold:
-                if self.key_states[state_name] is True:
-                    self.schedule_toggle_off[state_name] = True
-                    self.schedule_toggle_on[state_name] = False
-                if self.key_states[state_name] is False:
-                    self.schedule_toggle_on[state_name] = True
-                    self.schedule_toggle_off[state_name] = False
-
-        elif mode == Trigger.RAPID:
-            if val > threshold:
-                if self.key_states[state_name] is False:
-                    pydirectinput.press(keys=keysym)
-                    self.key_states[state_name] = True
-                    self.start_hold_ts[state_name] = time.time()
-
-                if self.key_states[state_name] is True:
-                    if (((time.time() - self.start_hold_ts[state_name]) * 1000)
-                            >= ConfigManager().config["rapid_fire_interval_ms"]):
-                        pydirectinput.press(keys=keysym)
-                        self.holding[state_name] = True
-                        self.start_hold_ts[state_name] = time.time()
-
-            if val < threshold:
-                if self.key_states[state_name] is True:
-                    self.key_states[state_name] = False
-                    self.start_hold_ts[state_name] = math.inf
-                    self.last_act_time[state_name] = int(time.time() * 1000)
-
-    def act(self, blendshape_values) -> None:
+    def flush(self) -> None:
+        """Inject the inputs queued by the actions, together, and record
+        their glass to action latency if the frame's capture time is known.
+        """
+        events = self.sink.flush()
+        if events and self.frame_timestamp is not None:
+            end = time.perf_counter()
+            for kind, _, _ in events:
+                StageTimings().record_action(kind, self.frame_timestamp, end)
+
+    def reset_pointer(self) -> None:
+        """Move the pointer to the center of its monitor."""
+        mon_id = self.get_current_monitor()
+        self.sink.move_to(self.monitors[mon_id]["center_x"],
+                          self.monitors[mon_id]["center_y"])
+
+    def cycle_pointer(self) -> None:
+        """Move the pointer to the center of the next monitor."""
+        mon_id = (self.get_current_monitor() + 1) % len(self.monitors)
+        self.sink.move_to(self.monitors[mon_id]["center_x"],
+                          self.monitors[mon_id]["center_y"])
+
+    def act(self, blendshape_values, timestamp: float = None) -> None:
         """Trigger devices action base on blendshape values
 
         Args:
             blendshape_values (npt.ArrayLike): blendshape values from tflite model
+            timestamp (float): capture time of the frame they were detected
+                in, from time.perf_counter(). Latency isn't recorded if None.
 
         Returns:
             dict: debug states
@@ -338,68 +235,77 @@ class Keybinder(metaclass=Singleton):
 
         if blendshape_values is None:
             return
+        self.frame_timestamp = timestamp
 
-        if (ConfigManager().mouse_bindings |
-            ConfigManager().keyboard_bindings) != self.last_know_keybindings:
+        if self.bindings_version != ConfigManager().bindings_version:
             self.init_states()
+        elif self.config_version != ConfigManager().config_version:
+            self.load_config()
 
-        for shape_name, v in (ConfigManager().mouse_bindings |
-                              ConfigManager().keyboard_bindings).items():
+        if len(self.binding_indices) == 0:
+            return
 
-            if shape_name not in shape_list.blendshape_names:
-                continue
-
-            device, action, threshold, mode, time_threshold = v
-            mode = Trigger(mode.lower())
-            # Get blendshape value
-            idx = shape_list.blendshape_indices[shape_name]
-            val = blendshape_values[idx]
-    
-            if device == "meta":
-                self.meta_action(val, action, threshold, self.is_active.get())
-            
-            if self.is_active.get():
-                if "blink" in shape_name:
-                    if val > threshold:
-                        self.blink_count += 1
-                        if self.blink_count < max(time_threshold*100, 1)*2: continue 
-                        '''
-                        Max value of max(time_threshold*100, 1)*2: 200. uuu
-                        Number 200 means 200 frames. When 200 frames, it takes about 1s.
-                        '''
-                    else: self.blink_count = 0
-            
-                if device == "mouse":
-                    self.mouse_action(val, action, threshold, mode)
-            
-                elif device == "keyboard":
-                    self.keyboard_action(val, action, threshold, mode)
-                self.blink_count = 0
-                
+        # One timestamp for all the bindings in this tick.
+        now = time.perf_counter()
+        frame_time = now if timestamp is None else timestamp
+        self.timing.throttle = ConfigManager().get_throttle_time()
+        if self.active_flag != self.was_active:
+            # Blinks held while inactive aren't timed.
+            self.was_active = self.active_flag
+            for binding in self.bindings:
+                binding.reset_dwell()
+
+        values = blendshape_values[self.binding_indices]
+        to_dispatch = ((values > self.binding_thresholds)
+                       | self.binding_engaged)
+        if not self.active_flag:
+            to_dispatch &= self.binding_always_on
+
+        for i in np.flatnonzero(to_dispatch):
+            binding = self.bindings[i]
+            val = values[i]
+
+            if binding.device == "meta":
+                if self.active_flag or self.binding_always_on[i]:
+                    binding.update(val, now)
+
+            elif self.active_flag:
+                if binding.dwell and binding.dwelling(val, frame_time):
+                    # Dispatched below threshold too, to stop the timer.
+                    self.binding_engaged[i] = True
+                    continue
+                binding.update(val, now)
+
+            self.binding_engaged[i] = (binding.engaged()
+                                       or binding.dwell_start is not None)
+
+        self.flush()
 
     def set_active(self, flag: bool) -> None:
-        self.is_active.set(flag)
+        """Activate or deactivate the bindings. From threads other than the
+        Tk thread, such as the pipeline thread running the pause action, only
+        active_flag is set, and the Tk variable and its traces follow on the
+        next sync_active_var() call.
+        """
+        self.active_flag = flag
+        if threading.current_thread() is self.tk_thread:
+            self.is_active.set(flag)
         if flag:
             self.delay_count = 0
 
     def toggle_active(self):
         logging.info("Toggle active")
-        current_state = self.is_active.get()
+        current_state = self.active_flag
         self.set_active(not current_state)
 
     def destroy(self):
         """Destroy the keybinder"""
         logger.info("releasing all keys...")
-        for state_name in self.key_states:
-            # TODO: too many python shenanigans. Might break if you look wrong at it
-            device, action = state_name.split("_")
-            if device == "mouse":
-                logger.info(f"releasing {state_name}")
-                pydirectinput.mouseUp(button=action)
-            if device == "keyboard":
-                logger.info(f"releasing {state_name}")
-                pydirectinput.keyUp(key=action)
-            elif device == "meta":
-                pass
+        for (device, action), actuator in self.actuators.items():
+            if device != "meta":
+                logger.info(f"releasing {device}_{action}")
+                actuator.release()
+        if self.sink is not None:
+            self.sink.flush()
 
         return
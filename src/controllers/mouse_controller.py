@@ -1,25 +1,23 @@
 import concurrent.futures as futures
 import logging
+import math
 import threading
 import time
 import tkinter as tk
 
-import numpy as np
 import numpy.typing as npt
-import pyautogui
 
 import src.utils as utils
-from src.accel_graph import SigmoidAccel
+from src.accel_graph import create_accel
 from src.config_manager import ConfigManager
+from src.controllers.input_sink import create_input_sink
 from src.singleton_meta import Singleton
+from src.stage_timings import StageTimings
 
 logger = logging.getLogger("MouseController")
 
-pyautogui.PAUSE = 0
-pyautogui.FAILSAFE = False
-
-# Max buffer number for apply smoothing.
-N_BUFFER = 100
+# Seconds to wait after (re)activation before moving the pointer.
+ACTIVATION_DELAY = 0.1
 
 
 class MouseController(metaclass=Singleton):
@@ -28,64 +26,157 @@ class MouseController(metaclass=Singleton):
         self.screen_h = None
         self.screen_w = None
         self.pool = None
+        self.sink = None
         self.accel = None
-        self.buffer = None
+        self.accel_config = None
+        self.pointer_filter = None
         logger.info("Initialize MouseController singleton")
         self.prev_x = 0
         self.prev_y = 0
         self.current_tracking_location = None
+        self.pointer_prediction = None
+        self.predictor = None
+        # Samples are added by the pipeline thread and read by the pointer
+        # thread.
+        self.predictor_lock = threading.Lock()
         self.smooth_kernel = None
-        self.delay_count = 0
+        self.config_version = None
+        self.spd_up = None
+        self.spd_down = None
+        self.spd_left = None
+        self.spd_right = None
+        self.mouse_acceleration = None
+        self.absolute_pointer = None
+        # Fractions of a pixel not moved yet, in relative mode.
+        self.remainder_x = 0.0
+        self.remainder_y = 0.0
+        # Virtual cursor in absolute mode, and the position it was last moved
+        # to, None to take it from the pointer on the next tick.
+        self.cursor_x = 0.0
+        self.cursor_y = 0.0
+        self.cursor_position = None
+        self.tick_interval = None
+        self.scheduler = None
+        # Start of the delay state, None to start it on the next tick.
+        self.delay_start = None
         self.top_count = 0
         self.is_started = False
         self.is_destroyed = False
         self.stop_flag = None
         self.is_active = tk.BooleanVar()
         self.is_enabled = None
+        # Set while active and enabled. The pointer thread waits on it, and
+        # doesn't read the Tk variables, which would block on the Tk thread.
+        self.run_flag = threading.Event()
+
+    def start(self, run_loop: bool = True):
+        """Start the controller.
 
-    def start(self):
+        Args:
+            run_loop (bool): start the pointer thread. Benchmarks pass False
+                and call tick() themselves.
+        """
         if not self.is_started:
             logger.info("Start MouseController singleton")
-            # Track-point buffer x, y
-            self.buffer = np.zeros([N_BUFFER, 2])
-            self.accel = SigmoidAccel()
             self.pool = futures.ThreadPoolExecutor(max_workers=1)
-            self.screen_w, self.screen_h = pyautogui.size()
-            self.calc_smooth_kernel()
+            try:
+                self.sink = create_input_sink(
+                    ConfigManager().config["input_backend"])
+            except (ValueError, ImportError, OSError) as e:
+                logger.error(e)
+                self.sink = create_input_sink("pyautogui")
+            self.screen_w, self.screen_h = self.sink.size()
+            self.scheduler = utils.DeadlineScheduler(
+                ConfigManager().config["tick_interval_ms"] / 1000)
+            self.load_config()
 
             self.is_enabled = tk.BooleanVar()
             self.is_enabled.set(ConfigManager().config["enable"])
+            self.is_active.trace_add("write", self.on_state_changed)
+            self.is_enabled.trace_add("write", self.on_state_changed)
+            self.on_state_changed()
 
             self.stop_flag = threading.Event()
-            self.pool.submit(self.main_loop)
+            if run_loop:
+                self.pool.submit(self.main_loop)
             self.is_started = True
 
+    def load_config(self):
+        """Cache the config values used on every tick. Called again when
+        ConfigManager publishes a config change.
+        """
+        self.config_version = ConfigManager().config_version
+        config = ConfigManager().config
+        self.spd_up = config["spd_up"]
+        self.spd_down = config["spd_down"]
+        self.spd_left = config["spd_left"]
+        self.spd_right = config["spd_right"]
+        self.mouse_acceleration = config["mouse_acceleration"]
+        self.absolute_pointer = config["absolute_pointer"]
+        accel_config = (config["accel_curve"], config["accel_params"],
+                        config["accel_points"])
+        if accel_config != self.accel_config:
+            self.accel_config = accel_config
+            try:
+                self.accel = create_accel(*accel_config)
+            except (ValueError, TypeError) as e:
+                logger.error(e)
+                self.accel = create_accel("sigmoid")
+        self.tick_interval = config["tick_interval_ms"] / 1000
+        self.scheduler.set_interval(self.tick_interval)
+        self.calc_smooth_kernel()
+        if config["pointer_prediction"] != self.pointer_prediction:
+            self.pointer_prediction = config["pointer_prediction"]
+            try:
+                predictor = utils.create_pointer_predictor(
+                    self.pointer_prediction)
+            except ValueError as e:
+                logger.error(e)
+                predictor = utils.create_pointer_predictor("none")
+            with self.predictor_lock:
+                self.predictor = predictor
+
     def calc_smooth_kernel(self):
         new_pointer_smooth = ConfigManager().config["pointer_smooth"]
-        if self.smooth_kernel is None:
+        if (self.smooth_kernel is None
+                or new_pointer_smooth != len(self.smooth_kernel)):
             self.smooth_kernel = utils.calc_smooth_kernel(new_pointer_smooth)
-
-        elif new_pointer_smooth != len(self.smooth_kernel):
-            self.smooth_kernel = utils.calc_smooth_kernel(new_pointer_smooth)
-
-        else:
-            pass
+            # Track-point filter x, y. Assigned in one step because the mouse
+            # thread may be using the previous filter.
+            self.pointer_filter = utils.FIRFilter(self.smooth_kernel, 2)
 
     def asymmetry_scale(self, vel_x, vel_y) -> tuple[int, int]:
         if vel_x > 0:
-            vel_x *= ConfigManager().config["spd_right"]
+            vel_x *= self.spd_right
         else:
-            vel_x *= ConfigManager().config["spd_left"]
+            vel_x *= self.spd_left
 
         if vel_y > 0:
-            vel_y *= ConfigManager().config["spd_down"]
+            vel_y *= self.spd_down
         else:
-            vel_y *= ConfigManager().config["spd_up"]
+            vel_y *= self.spd_up
 
         return vel_x, vel_y
 
-    def act(self, tracking_location: npt.ArrayLike):
+    def act(self, tracking_location: npt.ArrayLike, timestamp: float):
+        """Take the latest tracking location.
+
+        Args:
+            tracking_location (ArrayLike): x, y in frame pixels
+            timestamp (float): capture time of the frame it was detected in,
+                from time.perf_counter()
+        """
         self.current_tracking_location = tracking_location
+        with self.predictor_lock:
+            self.predictor.add_sample(tracking_location, timestamp)
+
+    def on_state_changed(self, *args):
+        if self.is_active.get() and self.is_enabled.get():
+            if not self.run_flag.is_set():
+                self.delay_start = None
+            self.run_flag.set()
+        else:
+            self.run_flag.clear()
 
     def main_loop(self) -> None:
         """ Separate thread for mouse controller          
@@ -97,50 +188,120 @@ class MouseController(metaclass=Singleton):
         if self.is_destroyed:
             return
 
+        self.scheduler.reset()
         while not self.stop_flag.is_set():
-            if not self.is_active.get() or not self.is_enabled.get():
-                time.sleep(0.001)
+            if not self.run_flag.is_set():
+                self.run_flag.wait()
+                self.scheduler.reset()
                 continue
 
-            self.buffer = np.roll(self.buffer, shift=-1, axis=0)
-            self.buffer[-1] = self.current_tracking_location
-
-            # Get latest x, y and smooth.
-            smooth_px, smooth_py = utils.apply_smoothing(
-                self.buffer, self.smooth_kernel)
-
-            vel_x = smooth_px - self.prev_x
-            vel_y = smooth_py - self.prev_y
-
-            self.prev_x = smooth_px
-            self.prev_y = smooth_py
-
-            # In delay state
-            self.delay_count += 1
-            if self.delay_count < N_BUFFER:
-                time.sleep(0.001)
-                continue
+            self.tick()
+            self.scheduler.wait(self.stop_flag)
 
-            vel_x, vel_y = self.asymmetry_scale(vel_x, vel_y)
+    def get_tick_jitter(self) -> dict:
+        """Timing of the pointer thread, see DeadlineScheduler.get_jitter."""
+        return self.scheduler.get_jitter()
 
-            if ConfigManager().config["mouse_acceleration"]:
-                vel_x *= self.accel(vel_x)
-                vel_y *= self.accel(vel_y)
+    def tick(self) -> bool:
+        """Smooth the latest tracking location and move the pointer.
 
-            # pydirectinput is not working here
-            pyautogui.move(xOffset=vel_x, yOffset=vel_y)
-
-            time.sleep(ConfigManager().config["tick_interval_ms"] / 1000)
+        Returns:
+            bool: False if the pointer wasn't moved, because no face has been
+                detected yet or the controller is in its delay state.
+        """
+        if self.current_tracking_location is None:
+            # No face detected yet.
+            return False
+
+        if self.config_version != ConfigManager().config_version:
+            self.load_config()
+
+        now = time.perf_counter()
+        with self.predictor_lock:
+            location = self.predictor.predict(now)
+            # Capture time of the latest frame the location is from.
+            capture_time = self.predictor.timestamp
+        if location is None:
+            location = self.current_tracking_location
+        if self.delay_start is None:
+            # Fill the filter so the pointer doesn't drift from stale samples.
+            self.delay_start = now
+            self.pointer_filter.reset(location)
+            self.prev_x, self.prev_y = location
+            self.remainder_x = self.remainder_y = 0.0
+            self.cursor_position = None
+
+        # Get latest x, y and smooth.
+        smooth_px, smooth_py = self.pointer_filter.update(location)
+
+        vel_x = smooth_px - self.prev_x
+        vel_y = smooth_py - self.prev_y
+
+        self.prev_x = smooth_px
+        self.prev_y = smooth_py
+
+        # In delay state
+        if now - self.delay_start < ACTIVATION_DELAY:
+            return False
+
+        vel_x, vel_y = self.asymmetry_scale(vel_x, vel_y)
+
+        if self.mouse_acceleration:
+            # Scale by the gain for the speed, so the direction is kept.
+            gain = self.accel(math.hypot(vel_x, vel_y))
+            vel_x *= gain
+            vel_y *= gain
+        move_start = time.perf_counter()
+        StageTimings().record("smoothing", now, move_start)
+
+        if self.absolute_pointer:
+            self.move_absolute(vel_x, vel_y)
+        else:
+            self.move_relative(vel_x, vel_y)
+        events = self.sink.flush()
+        move_end = time.perf_counter()
+        StageTimings().record("mouse_move", move_start, move_end)
+        if events and capture_time is not None:
+            StageTimings().record_action("move", capture_time, move_end)
+        return True
+
+    def move_relative(self, vel_x: float, vel_y: float) -> None:
+        """Move the pointer by the whole pixels of the velocity plus the
+        fractions left over from previous ticks, and keep the new fractions,
+        so that slow head movements aren't truncated away.
+        """
+        vel_x += self.remainder_x
+        vel_y += self.remainder_y
+        step_x = int(vel_x)
+        step_y = int(vel_y)
+        self.remainder_x = vel_x - step_x
+        self.remainder_y = vel_y - step_y
+        if step_x or step_y:
+            self.sink.move(step_x, step_y)
+
+    def move_absolute(self, vel_x: float, vel_y: float) -> None:
+        """Move a virtual cursor with sub-pixel precision, clamped to the
+        primary screen, and move the pointer to it.
+        """
+        position = self.sink.position()
+        if position != self.cursor_position:
+            # Moved by something else, such as the reset action or a mouse.
+            self.cursor_x, self.cursor_y = position
+        self.cursor_x = min(max(self.cursor_x + vel_x, 0), self.screen_w - 1)
+        self.cursor_y = min(max(self.cursor_y + vel_y, 0), self.screen_h - 1)
+        self.cursor_position = (round(self.cursor_x), round(self.cursor_y))
+        if self.cursor_position != position:
+            self.sink.move_to(*self.cursor_position)
 
     def set_enabled(self, flag: bool) -> None:
         self.is_enabled.set(flag)
         if flag:
-            self.delay_count = 0
+            self.delay_start = None
 
     def set_active(self, flag: bool) -> None:
         self.is_active.set(flag)
         if flag:
-            self.delay_count = 0
+            self.delay_start = None
 
     def toggle_active(self):
         logging.info("Toggle active")
@@ -152,4 +313,8 @@ class MouseController(metaclass=Singleton):
             self.is_active.set(False)
         if self.stop_flag is not None:
             self.stop_flag.set()
+        # Wake the pointer thread so that it sees the stop flag.
+        self.run_flag.set()
+        if self.scheduler is not None:
+            logger.info(f"Pointer tick jitter {self.get_tick_jitter()}")
         self.is_destroyed = True
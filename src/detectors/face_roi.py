@@ -0,0 +1,119 @@
+import cv2
+import numpy as np
+import numpy.typing as npt
+
+# Side of the square image that a region of interest is resized to, in
+# pixels. The landmark model runs at 256 by 256.
+ROI_SIZE = 256
+
+# Side of the region of interest, relative to the larger side of the face.
+ROI_SCALE = 2.0
+
+# Consecutive results with a face before cropping starts.
+STABLE_RESULTS = 5
+
+# Consecutive results without a face before going back to the whole frame.
+# The landmarker loses the face for a result or two whenever the region
+# moves, because it tracks the face in image coordinates, and finds it again
+# in the region.
+LOST_RESULTS = 3
+
+# Window of the whole frame, as x, y, width and height in normalized frame
+# coordinates.
+FULL_WINDOW = (0.0, 0.0, 1.0, 1.0)
+
+
+class FaceROI:
+    """Crops frames to a square region around the face once tracking is
+    stable, and resizes the region to a small fixed size. The whole frame is
+    used until the face has been found in STABLE_RESULTS results in a row,
+    and again once it has been lost for LOST_RESULTS.
+
+    The region only moves when the face gets near its edge or changes size a
+    lot, so that the landmarker can keep tracking.
+
+    update() and lost() are called from the landmarker result thread and
+    crop() from the pipeline thread. The region is replaced, not changed, so
+    crop() always sees a consistent one.
+    """
+
+    def __init__(self):
+        # Left, top and side of the region in frame pixels, or None for the
+        # whole frame.
+        self.region = None
+        self.n_stable = 0
+        self.n_lost = 0
+        self.buffer = np.zeros((ROI_SIZE, ROI_SIZE, 3), np.uint8)
+
+    def reset(self) -> None:
+        self.region = None
+        self.n_stable = 0
+        self.n_lost = 0
+
+    def lost(self) -> None:
+        """Take a result without a face."""
+        self.n_stable = 0
+        if self.region is not None:
+            self.n_lost += 1
+            if self.n_lost >= LOST_RESULTS:
+                self.reset()
+
+    def update(self, face_box: npt.ArrayLike,
+               frame_size: tuple[int, int]) -> None:
+        """Take the face bounding box of a result.
+
+        Args:
+            face_box (ArrayLike): left, top, right and bottom in frame pixels
+            frame_size (tuple): frame width and height in pixels
+        """
+        self.n_lost = 0
+        region = self.region
+        if region is None:
+            self.n_stable += 1
+            if self.n_stable < STABLE_RESULTS:
+                return
+
+        left, top, right, bottom = face_box
+        size = max(right - left, bottom - top) * ROI_SCALE
+        if region is not None:
+            x, y, side = region
+            # Keep the region while the face is well inside it and not much
+            # bigger or smaller than when the region was placed.
+            margin = (side - side / ROI_SCALE) / 4
+            if (left > x + margin and right < x + side - margin
+                    and top > y + margin and bottom < y + side - margin
+                    and 0.8 < size / side < 1.25):
+                return
+
+        width, height = frame_size
+        side = int(min(size, width, height))
+        x = int(min(max((left + right - side) / 2, 0), width - side))
+        y = int(min(max((top + bottom - side) / 2, 0), height - side))
+        self.region = (x, y, side)
+
+    def crop(self, frame: npt.NDArray[np.uint8]
+             ) -> tuple[npt.NDArray[np.uint8], tuple]:
+        """Image to detect in.
+
+        Args:
+            frame (ndarray): whole frame
+
+        Returns:
+            tuple: image, and its window as x, y, width and height in
+                normalized frame coordinates. The image is the frame itself if
+                there's no region, and a reused buffer otherwise.
+        """
+        region = self.region
+        height, width = frame.shape[:2]
+        if region is None or region[2] > min(width, height):
+            return frame, FULL_WINDOW
+
+        x, y, side = region
+        x = min(x, width - side)
+        y = min(y, height - side)
+        # Bilinear, because area interpolation is several times slower at
+        # these non-integer scales.
+        cv2.resize(frame[y:y + side, x:x + side], (ROI_SIZE, ROI_SIZE),
+                   dst=self.buffer)
+        return self.buffer, (x / width, y / height, side / width,
+                             side / height)
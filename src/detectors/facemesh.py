@@ -1,4 +1,5 @@
 import logging
+import threading
 import time
 from typing import Any
 
@@ -14,14 +15,63 @@ from numpy import ndarray, dtype
 
 import src.utils as utils
 from src.config_manager import ConfigManager
+from src.session_recorder import SessionRecorder
 from src.singleton_meta import Singleton
+from src.stage_timings import StageTimings
+from .face_roi import FaceROI, FULL_WINDOW
 
 logger = logging.getLogger("FaceMesh")
 
 MP_TASK_FILE = "assets/task/face_landmarker_with_blendshapes.task"
 
-BLENDS_MAX_BUFFER = 100
 N_SHAPES = 52
+N_LANDMARKS = 478
+
+# Corner, corner, top and bottom landmarks of the left eye, then the right.
+EYE_LANDMARKS = np.array(((33, 133, 159, 145), (362, 263, 386, 374)))
+
+# Seconds after which a submitted frame with no result is taken to have been
+# dropped inside MediaPipe.
+IN_FLIGHT_EXPIRY = 1.0
+
+# Top, bottom, left and right of the face outline, for the detection region
+# of interest.
+OUTLINE_LANDMARKS = np.array((10, 152, 234, 454))
+
+# Blendshape indices that the eye aspect ratio blink values replace.
+BLINK_RIGHT = 9
+BLINK_LEFT = 10
+BLINK = 11
+
+TRACKING_FILTER_KEYS = ("tracking_filter", "tracking_filter_min_cutoff",
+                        "tracking_filter_beta",
+                        "tracking_filter_process_noise",
+                        "tracking_filter_measurement_noise")
+
+
+def create_tracking_filter(config: dict):
+    """Create the tracking location filter that a cursor config selects.
+
+    Args:
+        config (dict): cursor config, with the TRACKING_FILTER_KEYS
+
+    Returns:
+        OneEuroFilter, KalmanFilter or None for no filter
+    """
+    kind = config["tracking_filter"]
+    if kind == "one_euro":
+        return utils.OneEuroFilter(
+            min_cutoff=config["tracking_filter_min_cutoff"],
+            beta=config["tracking_filter_beta"])
+    if kind == "kalman":
+        return utils.KalmanFilter(
+            config["tracking_filter_process_noise"],
+            config["tracking_filter_measurement_noise"])
+    if kind != "none":
+        logger.error(f'Unknown tracking filter "{kind}".'
+                     ' Expected none, one_euro or kalman.')
+    return None
+
 np.set_printoptions(precision=2, suppress=True)
 
 class FaceMesh(metaclass=Singleton):
@@ -30,11 +80,38 @@ class FaceMesh(metaclass=Singleton):
         self.smooth_kernel = None
         logger.info("Initialize FaceMesh singleton")
         self.mp_landmarks = None
+        # Landmarks of the latest result, overwritten by every result.
+        self.landmarks = np.zeros((N_LANDMARKS, 3), np.float32)
         self.tracking_location = None
-        self.blendshapes_buffer = np.zeros([BLENDS_MAX_BUFFER, N_SHAPES])
+        # Tracking location and the capture time of its frame, in seconds on
+        # the time.perf_counter() clock, set together.
+        self.tracking_sample = None
+        self.blendshapes_filter = None
         self.smooth_blendshapes = None
+        # Blendshapes and the capture time of their frame, set together.
+        self.blendshapes_sample = None
         self.model = None
         self.latest_time_ms = 0
+        self.config_version = None
+        self.frame_width = None
+        self.frame_height = None
+        self.tracking_vert_idxs = None
+        self.use_transformation_matrix = None
+        self.used_landmarks = None
+        self.tracking_filter_config = None
+        self.tracking_filter = None
+        self.detection_roi = False
+        self.roi = FaceROI()
+        self.max_in_flight = 1
+        # Submit time and detection window of each frame that has no result
+        # yet, keyed by its landmarker timestamp. Notified when a result
+        # arrives.
+        self.in_flight = {}
+        self.in_flight_condition = threading.Condition()
+        self.last_frame_seq = None
+        self.frames_processed = 0
+        self.frames_dropped = 0
+        self.inference_time = None
         self.is_started = False
 
     def start(self):
@@ -53,16 +130,54 @@ class FaceMesh(metaclass=Singleton):
                 result_callback=self.mp_callback)
             self.model = vision.FaceLandmarker.create_from_options(options)
 
+            self.load_config()
+
+    def load_config(self):
+        """Cache the config values used in the result callback. Called again
+        when ConfigManager publishes a config change.
+        """
+        self.config_version = ConfigManager().config_version
+        config = ConfigManager().config
+        self.frame_width = config["fix_width"]
+        self.frame_height = config["fix_height"]
+        self.tracking_vert_idxs = np.array(config["tracking_vert_idxs"],
+                                           np.intp)
+        self.use_transformation_matrix = config["use_transformation_matrix"]
+        # The transformation matrix of a cropped image doesn't describe the
+        # head pose in the frame.
+        detection_roi = (config["detection_roi"]
+                         and not self.use_transformation_matrix)
+        if detection_roi != self.detection_roi:
+            self.detection_roi = detection_roi
+            self.roi.reset()
+        # Landmarks that the tracking location, blink values and region of
+        # interest are calculated from.
+        used_landmarks = np.union1d(self.tracking_vert_idxs, EYE_LANDMARKS)
+        if self.detection_roi:
+            used_landmarks = np.union1d(used_landmarks, OUTLINE_LANDMARKS)
+        self.used_landmarks = used_landmarks.tolist()
+        with self.in_flight_condition:
+            self.max_in_flight = max(config["max_in_flight"], 1)
+            self.in_flight_condition.notify_all()
+        tracking_filter_config = {key: config[key]
+                                  for key in TRACKING_FILTER_KEYS}
+        if tracking_filter_config != self.tracking_filter_config:
+            self.tracking_filter_config = tracking_filter_config
+            self.tracking_filter = create_tracking_filter(
+                tracking_filter_config)
+        if (self.smooth_kernel is None
+                or config["shape_smooth"] != len(self.smooth_kernel)):
             self.calc_smooth_kernel()
 
     def calc_smooth_kernel(self):
         self.smooth_kernel = utils.calc_smooth_kernel(
             ConfigManager().config["shape_smooth"])
+        self.blendshapes_filter = utils.FIRFilter(self.smooth_kernel,
+                                                  N_SHAPES)
 
     def calculate_tracking_location(self, mp_result, use_transformation_matrix=False) -> ndarray[Any, dtype[Any]]:
-        screen_w = ConfigManager().config["fix_width"]
-        screen_h = ConfigManager().config["fix_height"]
-        landmarks = mp_result.face_landmarks[0]
+        screen_w = self.frame_width
+        screen_h = self.frame_height
 
         if use_transformation_matrix:
             M = mp_result.facial_transformation_matrixes[0]
@@ -78,54 +193,215 @@ class FaceMesh(metaclass=Singleton):
             y_pixel = screen_h / 2 - (y_pixel * screen_h / 2)
 
         else:
-            axs = []
-            ays = []
-
-            for p in ConfigManager().config["tracking_vert_idxs"]:
-                px = landmarks[p].x * screen_w
-                py = landmarks[p].y * screen_h
-                axs.append(px)
-                ays.append(py)
-
-            x_pixel = np.mean(axs)
-            y_pixel = np.mean(ays)
+            points = self.landmarks[self.tracking_vert_idxs, :2]
+            # Faster than mean() for a few points.
+            x_pixel, y_pixel = points.sum(axis=0) / len(points)
+            x_pixel *= screen_w
+            y_pixel *= screen_h
 
         return np.array([x_pixel, y_pixel], np.float32)
 
+    def extract_landmarks(self, face_landmarks: list[NormalizedLandmark],
+                          indices: list[int] | None = None):
+        """Copy a result's landmarks into the landmarks array, once per
+        result.
+
+        Args:
+            face_landmarks (list): landmarks of one face
+            indices (list): landmarks to copy, all if None. Copying all costs
+                about 80 microseconds, so only the used ones are copied unless
+                a session is being recorded.
+        """
+        if len(face_landmarks) != len(self.landmarks):
+            self.landmarks = np.zeros((len(face_landmarks), 3), np.float32)
+        landmarks = self.landmarks
+        if indices is None:
+            # One pass per axis is faster than one per landmark.
+            landmarks[:, 0] = [landmark.x for landmark in face_landmarks]
+            landmarks[:, 1] = [landmark.y for landmark in face_landmarks]
+            landmarks[:, 2] = [landmark.z for landmark in face_landmarks]
+        else:
+            for i in indices:
+                landmark = face_landmarks[i]
+                landmarks[i] = (landmark.x, landmark.y, landmark.z)
+
+    def uncrop_landmarks(self, window: tuple, indices: list[int] | None = None):
+        """Map landmarks detected in a region of interest to normalized frame
+        coordinates.
+
+        Args:
+            window (tuple): x, y, width and height of the region of interest
+                in normalized frame coordinates
+            indices (list): landmarks to map, all if None
+        """
+        x, y, w, h = window
+        landmarks = (self.landmarks if indices is None else
+                     self.landmarks[indices])
+        landmarks *= (w, h, w)
+        landmarks[:, 0] += x
+        landmarks[:, 1] += y
+        if indices is not None:
+            self.landmarks[indices] = landmarks
+
+    def update_roi(self) -> None:
+        """Move the region of interest to follow the face."""
+        size = (self.frame_width, self.frame_height)
+        outline = self.landmarks[OUTLINE_LANDMARKS, :2] * size
+        self.roi.update(np.concatenate((outline.min(axis=0),
+                                        outline.max(axis=0))), size)
+
     def mp_callback(self, mp_result: FaceLandmarkerResult, output_image: mediapipe_image.Image, timestamp_ms: int) -> None:
+        callback_start = time.perf_counter()
+        with self.in_flight_condition:
+            submit_time, window = self.in_flight.pop(timestamp_ms,
+                                                     (None, FULL_WINDOW))
+            if submit_time is not None:
+                self.inference_time = callback_start - submit_time
+                StageTimings().record("inference", submit_time,
+                                      callback_start)
+            self.frames_processed += 1
+            self.in_flight_condition.notify_all()
+
         if len(mp_result.face_landmarks) >= 1 and len(
                 mp_result.face_blendshapes) >= 1:
+            if self.config_version != ConfigManager().config_version:
+                self.load_config()
+
             self.mp_landmarks = mp_result.face_landmarks[0]
+            is_recording = SessionRecorder().is_recording
+            indices = None if is_recording else self.used_landmarks
+            self.extract_landmarks(self.mp_landmarks, indices)
+            if window != FULL_WINDOW:
+                self.uncrop_landmarks(window, indices)
+            if self.detection_roi:
+                self.update_roi()
             # Point for moving pointer
-            self.tracking_location = self.calculate_tracking_location(
+            tracking_location = self.calculate_tracking_location(
                 mp_result,
-                use_transformation_matrix=ConfigManager(
-                ).config["use_transformation_matrix"])
-            self.blendshapes_buffer = np.roll(self.blendshapes_buffer,
-                                              shift=-1,
-                                              axis=0)
-
-            self.blendshapes_buffer[-1] = np.array(
-                [b.score for b in mp_result.face_blendshapes[0]])
-            self.smooth_blendshapes = utils.apply_smoothing(
-                self.blendshapes_buffer, self.smooth_kernel)
-            self.smooth_blendshapes[9] = self.detect_eye_blink_right()
-            self.smooth_blendshapes[10] = self.detect_eye_blink_left()
-            self.smooth_blendshapes[11] = self.detect_eye_blink()
+                use_transformation_matrix=self.use_transformation_matrix)
+            if self.tracking_filter is not None:
+                # Filter state carries over from one result to the next.
+                tracking_location = self.tracking_filter.update(
+                    tracking_location, timestamp_ms / 1000).astype(
+                        np.float32)
+            self.tracking_location = tracking_location
+            self.tracking_sample = (self.tracking_location,
+                                    timestamp_ms / 1000)
+            scores = [b.score for b in mp_result.face_blendshapes[0]]
+            smooth_blendshapes = self.blendshapes_filter.update(scores)
+            ear_left, ear_right = self.calculate_ears()
+            smooth_blendshapes[BLINK_RIGHT] = ear_right
+            smooth_blendshapes[BLINK_LEFT] = ear_left
+            smooth_blendshapes[BLINK] = (ear_left + ear_right) / 2
+            self.smooth_blendshapes = smooth_blendshapes
+            self.blendshapes_sample = (smooth_blendshapes,
+                                       timestamp_ms / 1000)
+
+            if is_recording:
+                SessionRecorder().record_detection(
+                    timestamp_ms, self.landmarks, scores,
+                    mp_result.facial_transformation_matrixes[0])
 
         else:
             self.mp_landmarks = None
             self.tracking_location = None
-
-    def detect_frame(self, frame_np: npt.ArrayLike):
-
-        t_ms = int(time.time() * 1000)
-        if t_ms <= self.latest_time_ms:
-            return
+            self.tracking_sample = None
+            # Start afresh when the face is found again.
+            if self.tracking_filter is not None:
+                self.tracking_filter.reset()
+            self.roi.lost()
+
+        StageTimings().record("detect_callback", callback_start)
+
+    def expire_in_flight(self) -> None:
+        """Forget frames that MediaPipe dropped without a result. Call with
+        in_flight_condition held.
+        """
+        expired_time = time.perf_counter() - IN_FLIGHT_EXPIRY
+        for t_ms, (submit_time, _) in list(self.in_flight.items()):
+            if submit_time < expired_time:
+                del self.in_flight[t_ms]
+                self.frames_dropped += 1
+
+    def wait_for_capacity(self, timeout: float) -> bool:
+        """Block until fewer than max_in_flight frames are being detected.
+        Waiting for capacity before taking the latest camera frame means
+        that the newest frame is detected, not a queued one.
+
+        Returns:
+            bool: True if a frame can be submitted, False on timeout
+        """
+        with self.in_flight_condition:
+            self.expire_in_flight()
+            return self.in_flight_condition.wait_for(
+                lambda: len(self.in_flight) < self.max_in_flight, timeout)
+
+    def detect_frame(self,
+                     frame_np: npt.ArrayLike,
+                     timestamp: float = None,
+                     seq: int = None) -> bool:
+        """Submit a frame to the landmarker, unless max_in_flight frames are
+        already being detected.
+
+        If the detection region of interest is on and the face has been
+        found in the latest few results, only the region around the face is
+        detected in, at a lower resolution.
+
+        Args:
+            frame_np (ArrayLike): RGB frame
+            timestamp (float): capture time of the frame, from
+                time.perf_counter(). Now if not given.
+            seq (int): camera frame sequence number. Frames skipped in the
+                sequence are counted as dropped.
+
+        Returns:
+            bool: True if the frame was submitted
+        """
+        submit_start = time.perf_counter()
+        if timestamp is None:
+            timestamp = submit_start
+        t_ms = int(timestamp * 1000)
+
+        with self.in_flight_condition:
+            if seq is not None:
+                if self.last_frame_seq is not None:
+                    self.frames_dropped += max(seq - self.last_frame_seq - 1,
+                                               0)
+                self.last_frame_seq = seq
+            self.expire_in_flight()
+            if (t_ms <= self.latest_time_ms
+                    or len(self.in_flight) >= self.max_in_flight):
+                self.frames_dropped += 1
+                return False
+            self.latest_time_ms = t_ms
+
+            # Cropped with the lock held so that the window is recorded for
+            # the frame before its result can arrive.
+            if self.detection_roi:
+                frame_np, window = self.roi.crop(frame_np)
+            else:
+                window = FULL_WINDOW
+            self.in_flight[t_ms] = (time.perf_counter(), window)
 
         frame_mp = mp.Image(image_format=mp.ImageFormat.SRGB, data=frame_np)
         self.model.detect_async(frame_mp, t_ms)
-        self.latest_time_ms = t_ms
+        StageTimings().record("detect_submit", submit_start)
+        return True
+
+    def get_frame_stats(self) -> dict:
+        """
+        Returns:
+            dict: processed and dropped frame counts, frames in flight, and
+                the latest submit to result time in milliseconds
+        """
+        with self.in_flight_condition:
+            return {
+                "processed": self.frames_processed,
+                "dropped": self.frames_dropped,
+                "in_flight": len(self.in_flight),
+                "inference_ms": (None if self.inference_time is None else
+                                 round(self.inference_time * 1000, 1))
+            }
 
     def get_landmarks(self) -> list[NormalizedLandmark]:
         return self.mp_landmarks
@@ -133,68 +409,42 @@ class FaceMesh(metaclass=Singleton):
     def get_tracking_location(self) -> ndarray:
         return self.tracking_location
 
+    def get_tracking_sample(self) -> tuple[ndarray, float] | None:
+        """
+        Returns:
+            tuple: (tracking location, capture time in seconds) or None if
+                no face is detected
+        """
+        return self.tracking_sample
+
     def get_blendshapes(self) -> npt.ArrayLike:  
         return self.smooth_blendshapes
 
-    def detect_eye_blink_right(self):
-        if self.mp_landmarks is None:
-            return 0.0  # No landmarks detected, return 0 or similar default value
-
-        # Define landmark indices for the right eye
-        right_eye_landmarks = [self.mp_landmarks[362], self.mp_landmarks[263], self.mp_landmarks[386], self.mp_landmarks[374]]
-
-        # Calculate EAR for right eye
-        re_ratio = self.calculate_ear(right_eye_landmarks)
-        return re_ratio
-        
-    def detect_eye_blink_left(self):
-        if self.mp_landmarks is None:
-            return 0.0  # No landmarks detected, return 0 or similar default value
-
-        # Define landmark indices for the left eye
-        left_eye_landmarks = [self.mp_landmarks[33], self.mp_landmarks[133], self.mp_landmarks[159], self.mp_landmarks[145]]
-
-        # Calculate EAR for left eye
-        le_ratio = self.calculate_ear(left_eye_landmarks)
-        return le_ratio
-
-    def detect_eye_blink(self):
-        """Calculate EAR and determine if a blink is detected."""
-        if self.mp_landmarks is None:
-            return 0.0  # No landmarks detected, return 0 or similar default value
-
-        # Define landmark indices for the eyes
-        left_eye_landmarks = [self.mp_landmarks[33], self.mp_landmarks[133], self.mp_landmarks[159], self.mp_landmarks[145]]
-        right_eye_landmarks = [self.mp_landmarks[362], self.mp_landmarks[263], self.mp_landmarks[386], self.mp_landmarks[374]]
-
-        # Calculate EAR for both eyes
-        re_ratio = self.calculate_ear(right_eye_landmarks)
-        le_ratio = self.calculate_ear(left_eye_landmarks)
-
-        # Combine EAR values (average or other logic)
-        ear_value = (re_ratio + le_ratio) / 2
-        
-        return ear_value
-
-    def calculate_ear(self, eye_landmarks):
-        """Calculate the Eye Aspect Ratio (EAR) for an eye."""
-        rw_distance = self.euclidean_distance(eye_landmarks[0], eye_landmarks[1])
-        rh_distance = self.euclidean_distance(eye_landmarks[2], eye_landmarks[3])
-
-        ear = rh_distance * 3 / rw_distance                
-        ear = 1 - ear        
-        if ear < 0:
-            ear = 0
-        
-        return ear
-
-    def euclidean_distance(self, point1, point2):
-        """Calculate the Euclidean distance between two points."""
-        return np.sqrt((point1.x - point2.x) ** 2 + (point1.y - point2.y) ** 2)
+    def get_blendshapes_sample(self) -> tuple[ndarray, float] | None:
+        """
+        Returns:
+            tuple: (blendshapes, capture time in seconds) or None if no face
+                has been detected yet
+        """
+        return self.blendshapes_sample
+
+    def calculate_ears(self) -> ndarray:
+        """Eye aspect ratio blink values of both eyes, from 0 for open to 1
+        for closed.
+
+        Returns:
+            ndarray: left and right values
+        """
+        eyes = self.landmarks[EYE_LANDMARKS, :2]
+        # Corner to corner and top to bottom vectors of each eye.
+        spans = eyes[:, ::2] - eyes[:, 1::2]
+        lengths = np.sqrt((spans * spans).sum(axis=-1))
+        return np.maximum(1 - lengths[:, 1] * 3 / lengths[:, 0], 0)
 
     def destroy(self):
+        logger.info(f"Frames {self.get_frame_stats()}")
         if self.model is not None:
             self.model.close()
         self.model = None
         self.mp_landmarks = None
-        self.blendshapes_buffer = None
+        self.blendshapes_filter = None
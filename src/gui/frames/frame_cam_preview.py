@@ -1,12 +1,13 @@
 import tkinter
 
 import customtkinter
-from PIL import Image, ImageTk
+from PIL import Image
 
 from src.camera_manager import CameraManager
 from src.config_manager import ConfigManager
 from src.controllers import Keybinder
 from src.gui.frames.safe_disposable_frame import SafeDisposableFrame
+from src.gui.preview_image import PreviewImage
 from pystray import Icon, MenuItem, Menu
 from PIL import Image, ImageDraw
 import threading
@@ -36,10 +37,6 @@ class FrameCamPreview(SafeDisposableFrame):
         threading.Thread(target=self.create_tray_icon, daemon=True).start()
 
         # Canvas.
-        self.placeholder_im = Image.open("assets/images/placeholder.png")
-        self.placeholder_im = ImageTk.PhotoImage(
-            image=self.placeholder_im.resize((CANVAS_WIDTH, CANVAS_HEIGHT)))
-
         self.canvas = tkinter.Canvas(master=self,
                                      width=CANVAS_WIDTH,
                                      height=CANVAS_HEIGHT,
@@ -151,11 +148,9 @@ class FrameCamPreview(SafeDisposableFrame):
                                 sticky="nw")
 
         # Set first image.
-        self.canvas_image = self.canvas.create_image(0,
-                                                     0,
-                                                     image=self.placeholder_im,
-                                                     anchor=tkinter.NW)
-        self.new_photo = None
+        self.preview = PreviewImage(
+            self.canvas, CANVAS_WIDTH, CANVAS_HEIGHT,
+            Image.open("assets/images/placeholder.png"))
         self.after(1, self.camera_loop)
 
     def show_app(self):
@@ -195,13 +190,7 @@ class FrameCamPreview(SafeDisposableFrame):
         if self.is_active:
             if CameraManager().is_destroyed:
                 return
-            frame_rgb = CameraManager().get_debug_frame()
-            # Assign ref to avoid garbage collected
-            self.new_photo = ImageTk.PhotoImage(
-                image=Image.fromarray(frame_rgb).resize((CANVAS_WIDTH,
-                                                         CANVAS_HEIGHT)))
-            self.canvas.itemconfig(self.canvas_image, image=self.new_photo)
-            self.canvas.update()
+            self.preview.update(*CameraManager().get_debug_frame_sample())
 
             self.after(ConfigManager().config["tick_interval_ms"],
                        self.camera_loop)
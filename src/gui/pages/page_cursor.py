@@ -218,7 +218,6 @@ class FrameSelectGesture(SafeDisposableFrame):
             if not self.slider_dragging:
                 ConfigManager().set_temp_config(field=div_name, value=new_value)
                 ConfigManager().apply_config()
-                MouseController().calc_smooth_kernel()
         else:
             div["entry"].configure(fg_color="#ee9e9d")
 
@@ -239,7 +238,6 @@ class FrameSelectGesture(SafeDisposableFrame):
         new_value = int(div["entry_var"].get())
         ConfigManager().set_temp_config(field=div_name, value=new_value)
         ConfigManager().apply_config()
-        MouseController().calc_smooth_kernel()
 
     def inner_refresh_profile(self):
         self.load_initial_config()
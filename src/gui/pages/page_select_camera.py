@@ -1,13 +1,13 @@
 import logging
 import tkinter
 
-from src import utils
 import customtkinter
-from PIL import Image, ImageTk
+from PIL import Image
 
 from src.camera_manager import CameraManager
 from src.config_manager import ConfigManager
 from src.gui.frames.safe_disposable_frame import SafeDisposableFrame
+from src.gui.preview_image import PreviewImage
 
 logger = logging.getLogger("PageSelectCamera")
 
@@ -46,10 +46,6 @@ class PageSelectCamera(SafeDisposableFrame):
         self.radio_buttons = []
 
         # Camera canvas
-        self.placeholder_im = Image.open(
-            "assets/images/placeholder.png").resize(
-                (CANVAS_WIDTH, CANVAS_HEIGHT))
-        self.placeholder_im = ImageTk.PhotoImage(self.placeholder_im)
         self.canvas = tkinter.Canvas(master=self,
                                      width=CANVAS_WIDTH,
                                      height=CANVAS_HEIGHT)
@@ -61,11 +57,9 @@ class PageSelectCamera(SafeDisposableFrame):
                          rowspan=MAX_ROWS)
 
         # Set first image.
-        self.canvas_im = self.canvas.create_image(0,
-                                                  0,
-                                                  image=self.placeholder_im,
-                                                  anchor=tkinter.NW)
-        self.new_photo = None
+        self.preview = PreviewImage(
+            self.canvas, CANVAS_WIDTH, CANVAS_HEIGHT,
+            Image.open("assets/images/placeholder.png"))
         self.latest_camera_list = []
 
     def update_radio_buttons(self):
@@ -82,7 +76,7 @@ class PageSelectCamera(SafeDisposableFrame):
             for row_i, cam_id in enumerate(new_camera_list):
                 radio_text = f"Camera {cam_id}"
 
-                cam_name = utils.get_camera_name(cam_id)
+                cam_name = CameraManager().get_camera_name(cam_id)
                 if cam_name is not None:
                     radio_text = f"{radio_text}: {cam_name}"
 
@@ -96,10 +90,12 @@ class PageSelectCamera(SafeDisposableFrame):
                 radio_buttons.append(radio_button)
 
             # Set selected radio_button
-            target_id = ConfigManager().config["camera_id"]
+            target_id = CameraManager().get_current_camera_id()
+            if target_id is None:
+                target_id = ConfigManager().config["camera_id"]
             self.radio_buttons = radio_buttons
             for radio_button in self.radio_buttons:
-                if f"Camera {target_id}" == radio_button.cget("text"):
+                if radio_button.cget("value") == target_id:
                     radio_button.select()
                     self.prev_radio_value = self.radio_var.get()
                     logger.info(f"Set initial camera to {target_id}")
@@ -120,6 +116,8 @@ class PageSelectCamera(SafeDisposableFrame):
 
     def switch_raw_debug(self, device_props):
         self.device_props = device_props
+        # The raw and debug frames are numbered separately.
+        self.preview.reset()
 
     def page_loop(self):
         if self.is_destroyed:
@@ -127,18 +125,10 @@ class PageSelectCamera(SafeDisposableFrame):
 
         if self.is_active:
             if self.device_props == "small":
-                frame_rgb = CameraManager().get_debug_frame()
+                self.preview.update(*CameraManager().get_debug_frame_sample())
             else:
-                frame_rgb = CameraManager().get_raw_frame()
-            
-            
-            # Assign ref to avoid garbage collected
-            self.new_photo = ImageTk.PhotoImage(
-                image=Image.fromarray(frame_rgb).resize((CANVAS_WIDTH,
-                                                         CANVAS_HEIGHT)))
-            self.canvas.itemconfig(self.canvas_im, image=self.new_photo)
-            self.canvas.update()
-            
+                self.preview.update(*CameraManager().get_raw_frame_sample())
+
             CameraManager().thread_cameras.assign_done_flag.wait()
             self.update_radio_buttons()
             self.after(ConfigManager().config["tick_interval_ms"],
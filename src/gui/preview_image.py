@@ -0,0 +1,81 @@
+import time
+import tkinter
+
+import cv2
+import numpy as np
+import numpy.typing as npt
+from PIL import Image, ImageTk
+
+from src.stage_timings import StageTimings
+
+
+class PreviewImage:
+    """Camera preview on a canvas, drawn into one Tk photo image that's
+    updated in place.
+
+    Each new frame is downscaled once into a preallocated buffer, copied into
+    a preallocated PIL image and pasted into the photo image. Frames that have
+    already been drawn are skipped, and so is all drawing while the canvas
+    isn't viewable, for example when its page isn't shown or the window is
+    minimized.
+
+    Args:
+        canvas (Canvas): canvas to draw on, at its top left corner
+        width (int): preview width in pixels
+        height (int): preview height in pixels
+        placeholder (Image): shown until the first frame
+    """
+
+    def __init__(self, canvas: tkinter.Canvas, width: int, height: int,
+                 placeholder: Image.Image):
+        self.canvas = canvas
+        self.size = (width, height)
+        self.buffer = np.zeros((height, width, 3), np.uint8)
+        self.image = Image.new("RGB", self.size)
+        self.photo = ImageTk.PhotoImage(
+            placeholder.convert("RGB").resize(self.size))
+        self.canvas_image = canvas.create_image(0,
+                                                0,
+                                                image=self.photo,
+                                                anchor=tkinter.NW)
+        # Sequence number of the frame drawn last.
+        self.seq = None
+        self.frame_shape = None
+        self.interpolation = None
+
+    def reset(self) -> None:
+        """Draw the next frame even if it has been drawn already."""
+        self.seq = None
+
+    def update(self, seq: int, frame: npt.NDArray[np.uint8]) -> bool:
+        """Draw a frame if it's new and the canvas is viewable.
+
+        Args:
+            seq (int): sequence number of the frame
+            frame (ndarray): RGB frame
+
+        Returns:
+            bool: True if the frame was drawn
+        """
+        if seq == self.seq or not self.canvas.winfo_viewable():
+            return False
+        render_start = time.perf_counter()
+        self.seq = seq
+
+        if frame.shape != self.frame_shape:
+            self.frame_shape = frame.shape
+            height, width = frame.shape[:2]
+            # Area interpolation is best for downscaling, but several times
+            # slower than bilinear unless the scale is a whole number.
+            if width % self.size[0] == 0 and height % self.size[1] == 0:
+                self.interpolation = cv2.INTER_AREA
+            else:
+                self.interpolation = cv2.INTER_LINEAR
+        cv2.resize(frame,
+                   self.size,
+                   dst=self.buffer,
+                   interpolation=self.interpolation)
+        self.image.frombytes(self.buffer)
+        self.photo.paste(self.image)
+        StageTimings().record("preview", render_start)
+        return True
@@ -1,35 +1,96 @@
 import logging
+import threading
+import time
 
 from src.camera_manager import CameraManager
 from src.controllers import Keybinder, MouseController
 from src.detectors import FaceMesh
+from src.stage_timings import StageTimings
+
+logger = logging.getLogger("Pipeline")
+
+# Seconds to wait for a new camera frame before checking the stop flag again.
+FRAME_WAIT_TIMEOUT = 0.5
 
 
 class Pipeline:
 
     def __init__(self):
         logging.info("Init Pipeline")
+        self.pipeline_stop_flag = threading.Event()
+        self.pipeline_thread = None
+        # Sequence number of the last camera frame sent to the detector.
+        self.last_frame_seq = 0
+
+    def start_pipeline(self) -> None:
+        """Start the worker thread that runs pipeline_tick on every new
+        camera frame, independently of the Tk event loop.
+        """
+        if self.pipeline_thread is not None:
+            return
+        logger.info("Start pipeline worker")
+        self.pipeline_stop_flag.clear()
+        self.pipeline_thread = threading.Thread(target=self.pipeline_loop,
+                                                name="Pipeline",
+                                                daemon=True)
+        self.pipeline_thread.start()
+
+    def stop_pipeline(self) -> None:
+        if self.pipeline_thread is None:
+            return
+        logger.info("Stop pipeline worker")
+        self.pipeline_stop_flag.set()
+        self.pipeline_thread.join(FRAME_WAIT_TIMEOUT * 2)
+        self.pipeline_thread = None
+
+    def pipeline_loop(self) -> None:
+        while not self.pipeline_stop_flag.is_set():
+            if not CameraManager().wait_new_frame(self.last_frame_seq,
+                                                  FRAME_WAIT_TIMEOUT):
+                continue
+            # Frames that arrive meanwhile are dropped, and the latest is
+            # taken once the detector can take it.
+            if not FaceMesh().wait_for_capacity(FRAME_WAIT_TIMEOUT):
+                continue
+            try:
+                self.pipeline_tick()
+            except Exception as e:
+                logger.critical(e, exc_info=e)
 
     def pipeline_tick(self) -> None:
 
-        frame_rgb = CameraManager().get_raw_frame()
+        latest = CameraManager().get_latest_frame()
+        if latest is None:
+            return
+        seq, timestamp, frame_rgb = latest
+        if seq == self.last_frame_seq:
+            # Already detected.
+            return
+        self.last_frame_seq = seq
 
         # Detect landmarks (async) and save in its buffer
-        FaceMesh().detect_frame(frame_rgb)
+        FaceMesh().detect_frame(frame_rgb, timestamp, seq)
 
         # Get facial landmarks
         landmarks = FaceMesh().get_landmarks()
         if (landmarks is None):
-            CameraManager().draw_overlay(tracking_location=None)
+            CameraManager().draw_overlay(frame_rgb, tracking_location=None)
             return
 
         # Control mouse position
-        tracking_location = FaceMesh().get_tracking_location()
-        MouseController().act(tracking_location)
+        tracking_sample = FaceMesh().get_tracking_sample()
+        if tracking_sample is None:
+            CameraManager().draw_overlay(frame_rgb, tracking_location=None)
+            return
+        tracking_location, tracking_timestamp = tracking_sample
+        MouseController().act(tracking_location, tracking_timestamp)
 
         # Control keyboard
-        blendshape_values = FaceMesh().get_blendshapes()
-        Keybinder().act(blendshape_values)
+        blendshapes_sample = FaceMesh().get_blendshapes_sample()
+        if blendshapes_sample is not None:
+            t0 = time.perf_counter()
+            Keybinder().act(*blendshapes_sample)
+            StageTimings().record("keybinder", t0)
 
         # Draw frame overlay
-        CameraManager().draw_overlay(tracking_location)
+        CameraManager().draw_overlay(frame_rgb, tracking_location)
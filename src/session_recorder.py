@@ -0,0 +1,230 @@
+"""\
+Recording and replay of sessions, for profiling the pipeline offline and
+reproducing field issues without the user's hardware.
+
+A session is a directory with these files.
+
+- session.json, frame shape and record counts.
+- frames.u8, raw camera frames as captured, before preprocessing. Read back as
+  a memory-mapped array.
+- frame_timestamps.f64, capture time of each frame in seconds from the start
+  of recording.
+- detection_timestamps_ms.i64, landmarks.f32, blendshapes.f32 and
+  matrices.f64, one record per face landmarker result with a face.
+
+Record counts are derived from the file sizes, so a session is readable even
+if the application didn't exit cleanly.
+"""
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+
+from src.singleton_meta import Singleton
+from src.utils.camera_source import CameraSource
+
+logger = logging.getLogger("SessionRecorder")
+
+SESSION_FILENAME = "session.json"
+FRAMES_FILENAME = "frames.u8"
+FRAME_TIMESTAMPS_FILENAME = "frame_timestamps.f64"
+
+# Detection arrays: filename, dtype and shape of one record.
+DETECTION_FILES = {
+    "timestamps_ms": ("detection_timestamps_ms.i64", np.int64, ()),
+    "landmarks": ("landmarks.f32", np.float32, (478, 3)),
+    "blendshapes": ("blendshapes.f32", np.float32, (52,)),
+    "matrices": ("matrices.f64", np.float64, (4, 4)),
+}
+
+
+def read_array(path: Path, dtype, record_shape: tuple) -> np.memmap:
+    record_size = np.dtype(dtype).itemsize * int(np.prod(record_shape))
+    count = path.stat().st_size // record_size
+    if count == 0:
+        return np.zeros((0, *record_shape), dtype)
+    return np.memmap(path, dtype, "r", shape=(count, *record_shape))
+
+
+def read_detections(directory: Path) -> dict[str, np.ndarray]:
+    """Read the face landmarker results of a session.
+
+    Returns:
+        dict: arrays keyed like DETECTION_FILES, all with the same length
+    """
+    arrays = {
+        name: read_array(Path(directory, filename), dtype, shape)
+        for name, (filename, dtype, shape) in DETECTION_FILES.items()
+    }
+    # Trim to the shortest in case recording was interrupted mid-record.
+    count = min(len(array) for array in arrays.values())
+    return {name: array[:count] for name, array in arrays.items()}
+
+
+class SessionRecorder(metaclass=Singleton):
+
+    def __init__(self):
+        logger.info("Initialize SessionRecorder singleton")
+        self.lock = threading.Lock()
+        self.directory = None
+        self.files = {}
+        self.start_time = None
+        self.frame_shape = None
+        self.frame_count = 0
+        self.detection_count = 0
+        self.is_recording = False
+
+    def start(self, directory: Path):
+        with self.lock:
+            if self.is_recording:
+                return
+            logger.info(f'Recording session to "{directory}"')
+            directory.mkdir(parents=True, exist_ok=True)
+            self.directory = directory
+            self.files = {
+                "frames": Path(directory, FRAMES_FILENAME).open("wb"),
+                "frame_timestamps":
+                Path(directory, FRAME_TIMESTAMPS_FILENAME).open("wb")
+            }
+            for name, (filename, _, _) in DETECTION_FILES.items():
+                self.files[name] = Path(directory, filename).open("wb")
+            self.start_time = time.perf_counter()
+            self.is_recording = True
+
+    def record_frame(self, frame_bgr: npt.NDArray[np.uint8],
+                     timestamp: float) -> None:
+        """Append a raw camera frame.
+
+        Args:
+            frame_bgr (ndarray): frame as read from the camera
+            timestamp (float): capture time, from time.perf_counter()
+        """
+        with self.lock:
+            if not self.is_recording:
+                return
+            if self.frame_shape is None:
+                self.frame_shape = frame_bgr.shape
+                self.write_session_file()
+            elif frame_bgr.shape != self.frame_shape:
+                # Camera was swapped. Only frames of the first shape are kept.
+                return
+            self.files["frames"].write(
+                np.ascontiguousarray(frame_bgr).data)
+            self.files["frame_timestamps"].write(
+                np.float64(timestamp - self.start_time).tobytes())
+            self.frame_count += 1
+
+    def record_detection(self, timestamp_ms: int,
+                         landmarks: npt.ArrayLike,
+                         blendshapes: npt.ArrayLike,
+                         matrix: npt.ArrayLike) -> None:
+        """Append a face landmarker result."""
+        with self.lock:
+            if not self.is_recording:
+                return
+            for name, value in (("timestamps_ms", timestamp_ms),
+                                ("landmarks", landmarks),
+                                ("blendshapes", blendshapes),
+                                ("matrices", matrix)):
+                dtype = DETECTION_FILES[name][1]
+                self.files[name].write(
+                    np.ascontiguousarray(value, dtype).tobytes())
+            self.detection_count += 1
+
+    def write_session_file(self):
+        with Path(self.directory, SESSION_FILENAME).open("w") as file:
+            json.dump(
+                {
+                    "frame_shape": self.frame_shape,
+                    "frame_count": self.frame_count,
+                    "detection_count": self.detection_count
+                },
+                file,
+                indent=4)
+
+    def stop(self):
+        with self.lock:
+            if not self.is_recording:
+                return
+            self.is_recording = False
+            for file in self.files.values():
+                file.close()
+            self.files = {}
+            self.write_session_file()
+            logger.info(f"Recorded {self.frame_count} frames and"
+                        f" {self.detection_count} detections.")
+
+
+class SessionReplayer(CameraSource):
+    """Plays back the frames of a recorded session as a camera source.
+    Playback loops at the end.
+
+    Args:
+        directory (Path): session directory
+        realtime (bool): keep the recorded frame timing, otherwise return
+            frames as fast as they are read
+    """
+
+    def __init__(self, directory: Path, realtime: bool = True):
+        super().__init__(f"Replay {Path(directory).name}")
+        self.directory = Path(directory)
+        self.realtime = realtime
+        self.frames = None
+        self.timestamps = None
+        self.count = 0
+        self.index = 0
+        self.start_time = None
+
+    def open(self) -> bool:
+        if self.is_opened:
+            return True
+        try:
+            with Path(self.directory, SESSION_FILENAME).open() as file:
+                frame_shape = tuple(json.load(file)["frame_shape"])
+            self.frames = read_array(Path(self.directory, FRAMES_FILENAME),
+                                     np.uint8, frame_shape)
+            self.timestamps = read_array(
+                Path(self.directory, FRAME_TIMESTAMPS_FILENAME), np.float64,
+                ())
+        except (OSError, KeyError, TypeError, ValueError) as e:
+            logger.error(f'Failed to open session "{self.directory}": {e}')
+            return False
+        self.count = min(len(self.frames), len(self.timestamps))
+        self.index = 0
+        self.start_time = None
+        self.is_opened = True
+        logger.info(
+            f'Replaying {self.count} frames from "{self.directory}"'
+            f' {"in real time" if self.realtime else "at maximum speed"}')
+        return True
+
+    def read(self) -> tuple[bool, npt.NDArray[np.uint8] | None]:
+        frames = self.frames
+        if frames is None or self.count == 0:
+            return False, None
+
+        if self.index >= self.count:
+            logger.info("Replay restarting from the first frame")
+            self.index = 0
+            self.start_time = None
+
+        if self.realtime:
+            timestamp = self.timestamps[self.index]
+            if self.start_time is None:
+                self.start_time = time.perf_counter() - timestamp
+            delay = self.start_time + timestamp - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        frame = frames[self.index]
+        self.index += 1
+        return True, frame
+
+    def release(self) -> None:
+        self.frames = None
+        self.timestamps = None
+        super().release()
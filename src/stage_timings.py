@@ -0,0 +1,148 @@
+import logging
+import threading
+import time
+
+import numpy as np
+
+from src.singleton_meta import Singleton
+
+logger = logging.getLogger("StageTimings")
+
+# Pipeline stages, in the order they're shown.
+STAGES = (
+    "camera_read",
+    "preprocess",
+    "detect_submit",
+    "inference",
+    "detect_callback",
+    "keybinder",
+    "smoothing",
+    "mouse_move",
+    "overlay",
+    "preview",
+)
+
+# Number of recent timings per stage that statistics are computed over.
+WINDOW = 512
+
+
+class TimingWindow:
+    """Durations and end times of the latest WINDOW runs of something."""
+
+    def __init__(self):
+        self.durations = np.zeros(WINDOW)
+        self.end_times = np.zeros(WINDOW)
+        self.count = 0
+
+    def add(self, duration: float, end: float) -> None:
+        i = self.count % WINDOW
+        self.durations[i] = duration
+        self.end_times[i] = end
+        self.count += 1
+
+    def get_stats(self) -> dict:
+        n = min(self.count, WINDOW)
+        durations_ms = self.durations[:n] * 1000
+        end_times = self.end_times[:n]
+        span = float(end_times.max() - end_times.min())
+        p50, p95, p99 = np.percentile(durations_ms, (50, 95, 99))
+        return {
+            "count": self.count,
+            "fps": (n - 1) / span if span > 0 else 0.0,
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+            "max_ms": float(durations_ms.max())
+        }
+
+
+class StageTimings(metaclass=Singleton):
+    """Rolling windows of how long each pipeline stage takes, and when it
+    last ran, for its rate and latency percentiles. Also of the glass to
+    action latency of each type of injected input, from the capture of the
+    frame that caused it to the call that injected it.
+
+    Times are from time.perf_counter(), and are recorded from whichever
+    thread runs the stage or injects the input.
+    """
+
+    def __init__(self):
+        logger.info("Initialize StageTimings singleton")
+        self.lock = threading.Lock()
+        self.stages = {stage: TimingWindow() for stage in STAGES}
+        # Added as action types are first injected.
+        self.actions = {}
+
+    def record(self, stage: str, start: float, end: float = None) -> None:
+        """Record one run of a stage.
+
+        Args:
+            stage (str): one of STAGES
+            start (float): start time, from time.perf_counter()
+            end (float): end time, now if not given
+        """
+        if end is None:
+            end = time.perf_counter()
+        with self.lock:
+            self.stages[stage].add(end - start, end)
+
+    def record_action(self, action: str, capture_time: float,
+                      end: float = None) -> None:
+        """Record the glass to action latency of one injected input.
+
+        Args:
+            action (str): type of input, for example click or keyDown
+            capture_time (float): capture time of the camera frame that the
+                input was decided from, from time.perf_counter()
+            end (float): time the input was injected, now if not given
+        """
+        if end is None:
+            end = time.perf_counter()
+        with self.lock:
+            window = self.actions.get(action)
+            if window is None:
+                window = self.actions[action] = TimingWindow()
+            window.add(end - capture_time, end)
+
+    def reset(self) -> None:
+        with self.lock:
+            self.stages = {stage: TimingWindow() for stage in STAGES}
+            self.actions = {}
+
+    def get_stats(self) -> dict:
+        """Rate and latency of each stage over its recent runs.
+
+        Returns:
+            dict: for each stage that has run, its run count, and its rate in
+                runs per second and p50, p95, p99 and max duration in
+                milliseconds over the window
+        """
+        with self.lock:
+            return {
+                stage: window.get_stats()
+                for stage, window in self.stages.items() if window.count > 0
+            }
+
+    def get_action_stats(self) -> dict:
+        """Glass to action latency of each type of injected input, in the
+        same form as get_stats().
+        """
+        with self.lock:
+            return {
+                action: window.get_stats()
+                for action, window in sorted(self.actions.items())
+            }
+
+    def format_stats(self) -> list[str]:
+        """Lines of text with the stats of each stage that has run, then of
+        each type of injected input.
+        """
+        lines = [f"{'stage':<18}{'fps':>5}{'p50':>7}{'p95':>7}{'p99':>7} ms"]
+        for prefix, stats in (("", self.get_stats()),
+                              ("latency ", self.get_action_stats())):
+            for name, name_stats in stats.items():
+                lines.append(f"{prefix + name:<18}{name_stats['fps']:>5.0f}"
+                             f"{name_stats['p50_ms']:>7.2f}"
+                             f"{name_stats['p95_ms']:>7.2f}"
+                             f"{name_stats['p99_ms']:>7.2f}")
+        return lines
@@ -66,6 +66,14 @@ class TaskKiller(metaclass=Singleton):
         Keybinder().destroy()
         FaceMesh().destroy()
 
+        from src.stage_timings import StageTimings
+        logger.info(f"Stage timings {StageTimings().get_stats()}")
+        logger.info(f"Glass to action latency"
+                    f" {StageTimings().get_action_stats()}")
+
+        from src.session_recorder import SessionRecorder
+        SessionRecorder().stop()
+
         utils.remove_fonts("assets/fonts")
 
         self._terminate_tree(
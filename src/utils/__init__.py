@@ -1,4 +1,9 @@
-__all__ = ['calc_smooth_kernel', 'apply_smoothing', 'open_camera', 'get_camera_name','assign_cameras_queue', 'assign_cameras_unblock', 'install_fonts', 'remove_fonts']
+__all__ = ['calc_smooth_kernel', 'open_camera', 'get_camera_name','assign_cameras_queue', 'assign_cameras_unblock', 'load_camera_cache', 'save_camera_cache', 'install_fonts', 'remove_fonts', 'FrameRingBuffer', 'FramePreprocessor', 'FIRFilter', 'EMAFilter', 'OneEuroFilter', 'KalmanFilter', 'PointerPredictor', 'create_pointer_predictor', 'CameraSource', 'hardware_source', 'create_camera_source', 'DeadlineScheduler']
 from .install_font import install_fonts, remove_fonts
-from .list_cameras import assign_cameras_queue, assign_cameras_unblock, open_camera, get_camera_name
-from .smoothing import calc_smooth_kernel, apply_smoothing
+from .list_cameras import assign_cameras_queue, assign_cameras_unblock, open_camera, get_camera_name, load_camera_cache, save_camera_cache
+from .smoothing import calc_smooth_kernel, FIRFilter, EMAFilter, OneEuroFilter, KalmanFilter
+from .frame_ring_buffer import FrameRingBuffer
+from .frame_preprocessor import FramePreprocessor
+from .camera_source import CameraSource, hardware_source, create_camera_source
+from .scheduler import DeadlineScheduler
+from .pointer_prediction import PointerPredictor, create_pointer_predictor
@@ -0,0 +1,306 @@
+import abc
+import logging
+import math
+import platform
+import threading
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import numpy.typing as npt
+
+logger = logging.getLogger("CameraSource")
+
+IMAGE_SUFFIXES = (".bmp", ".jpeg", ".jpg", ".png", ".tif", ".tiff", ".webp")
+
+
+class CameraSource(metaclass=abc.ABCMeta):
+    """Source of BGR frames with the read() and release() interface of
+    cv2.VideoCapture. Sources can be opened again after release().
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.is_opened = False
+
+    @abc.abstractmethod
+    def open(self) -> bool:
+        """Open the source, if it isn't already open.
+
+        Returns:
+            bool: True if the source is open
+        """
+        pass
+
+    @abc.abstractmethod
+    def read(self) -> tuple[bool, npt.NDArray[np.uint8] | None]:
+        pass
+
+    def release(self) -> None:
+        self.is_opened = False
+
+
+class FramePacer:
+    """Sleeps so that frames are returned at a steady rate."""
+
+    def __init__(self, fps: float):
+        self.interval = 1 / fps if fps > 0 else 0
+        self.next_time = None
+
+    def wait(self) -> None:
+        now = time.perf_counter()
+        if self.next_time is not None and self.next_time > now:
+            time.sleep(self.next_time - now)
+            now = self.next_time
+        self.next_time = now + self.interval
+
+    def reset(self) -> None:
+        self.next_time = None
+
+
+class VideoCaptureSource(CameraSource):
+    """Camera device opened through an OpenCV capture backend.
+
+    Args:
+        index (int): device index
+        api_preference (int): cv2.CAP_* backend
+        backend_name (str): name the opened capture has to report, or None to
+            accept any backend
+    """
+
+    def __init__(self, index: int, api_preference: int,
+                 backend_name: str | None):
+        super().__init__(f"{backend_name or 'Camera'} {index}")
+        self.index = index
+        self.api_preference = api_preference
+        self.backend_name = backend_name
+        self.capture = None
+        # Release can be called from another thread during read.
+        self.lock = threading.Lock()
+
+    def open(self) -> bool:
+        with self.lock:
+            if self.is_opened:
+                return True
+            capture = cv2.VideoCapture(self.index, self.api_preference)
+
+            if not capture.isOpened():
+                logger.info(f"Camera {self.index}: not found")
+                return False
+
+            if (self.backend_name is not None
+                    and capture.getBackendName() != self.backend_name):
+                logger.info(f"Camera {self.index}:"
+                            f" {capture.getBackendName()} is not supported")
+                capture.release()
+                return False
+
+            if capture.get(cv2.CAP_PROP_FRAME_WIDTH) <= 0:
+                logger.info(f"Camera {self.index}: frame size error.")
+                capture.release()
+                return False
+
+            self.capture = capture
+            self.is_opened = True
+            return True
+
+    def read(self) -> tuple[bool, npt.NDArray[np.uint8] | None]:
+        with self.lock:
+            if self.capture is None:
+                return False, None
+            return self.capture.read()
+
+    def release(self) -> None:
+        with self.lock:
+            if self.capture is not None:
+                self.capture.release()
+            self.capture = None
+            super().release()
+
+
+class DirectShowSource(VideoCaptureSource):
+
+    def __init__(self, index: int):
+        super().__init__(index, cv2.CAP_DSHOW, "DSHOW")
+
+
+class V4L2Source(VideoCaptureSource):
+
+    def __init__(self, index: int):
+        super().__init__(index, cv2.CAP_V4L2, "V4L2")
+
+
+def hardware_source(index: int) -> CameraSource:
+    """Camera device source for the backend of this platform."""
+    system = platform.system()
+    if system == "Windows":
+        return DirectShowSource(index)
+    if system == "Linux":
+        return V4L2Source(index)
+    return VideoCaptureSource(index, cv2.CAP_ANY, None)
+
+
+class VideoFileSource(CameraSource):
+    """Frames of a video file, at the file's frame rate. Loops at the end.
+
+    Args:
+        path (Path): video file
+        realtime (bool): keep the file's frame rate, otherwise return frames
+            as fast as they are decoded
+    """
+
+    def __init__(self, path: Path, realtime: bool = True):
+        super().__init__(f"File {Path(path).name}")
+        self.path = Path(path)
+        self.realtime = realtime
+        self.capture = None
+        self.pacer = None
+        self.lock = threading.Lock()
+
+    def open(self) -> bool:
+        with self.lock:
+            if self.is_opened:
+                return True
+            capture = cv2.VideoCapture(str(self.path))
+            if not capture.isOpened():
+                logger.error(f'Failed to open video file "{self.path}"')
+                return False
+            fps = capture.get(cv2.CAP_PROP_FPS)
+            self.pacer = FramePacer(fps if fps > 0 else 30)
+            self.capture = capture
+            self.is_opened = True
+            return True
+
+    def read(self) -> tuple[bool, npt.NDArray[np.uint8] | None]:
+        with self.lock:
+            if self.capture is None:
+                return False, None
+            if self.realtime:
+                self.pacer.wait()
+            ret, frame = self.capture.read()
+            if not ret:
+                logger.info(f'Video file "{self.path}" restarting')
+                self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ret, frame = self.capture.read()
+            return ret, frame
+
+    def release(self) -> None:
+        with self.lock:
+            if self.capture is not None:
+                self.capture.release()
+            self.capture = None
+            super().release()
+
+
+class ImageDirectorySource(CameraSource):
+    """Image files of a directory in name order, as frames at a fixed rate.
+    Loops at the end.
+    """
+
+    def __init__(self, directory: Path, fps: float = 30):
+        super().__init__(f"Images {Path(directory).name}")
+        self.directory = Path(directory)
+        self.pacer = FramePacer(fps)
+        self.paths = []
+        self.index = 0
+
+    def open(self) -> bool:
+        if self.is_opened:
+            return True
+        try:
+            self.paths = sorted(path for path in self.directory.iterdir()
+                                if path.suffix.lower() in IMAGE_SUFFIXES)
+        except OSError as e:
+            logger.error(f'Failed to list images in "{self.directory}": {e}')
+            return False
+        if not self.paths:
+            logger.error(f'No images in "{self.directory}"')
+            return False
+        self.index = 0
+        self.pacer.reset()
+        self.is_opened = True
+        return True
+
+    def read(self) -> tuple[bool, npt.NDArray[np.uint8] | None]:
+        if not self.is_opened:
+            return False, None
+        self.pacer.wait()
+        path = self.paths[self.index]
+        self.index = (self.index + 1) % len(self.paths)
+        frame = cv2.imread(str(path), cv2.IMREAD_COLOR)
+        return frame is not None, frame
+
+
+class SyntheticFaceSource(CameraSource):
+    """Generated frames of a simple face that moves, blinks and opens its
+    mouth, for running the capture to action path without a camera.
+    """
+
+    def __init__(self, width: int = 640, height: int = 480, fps: float = 30):
+        super().__init__("Synthetic face")
+        self.width = width
+        self.height = height
+        self.pacer = FramePacer(fps)
+        self.frame = np.empty((height, width, 3), np.uint8)
+        self.start_time = None
+
+    def open(self) -> bool:
+        self.start_time = time.perf_counter()
+        self.pacer.reset()
+        self.is_opened = True
+        return True
+
+    def read(self) -> tuple[bool, npt.NDArray[np.uint8] | None]:
+        if not self.is_opened:
+            return False, None
+        self.pacer.wait()
+        t = time.perf_counter() - self.start_time
+
+        w, h = self.width, self.height
+        cx = int(w * (0.5 + 0.15 * math.sin(0.7 * t)))
+        cy = int(h * (0.5 + 0.1 * math.sin(1.1 * t)))
+        face_w, face_h = w // 6, h // 4
+        eye_open = (t % 4) >= 0.2
+        mouth_open = (t % 3) < 0.6
+
+        frame = self.frame
+        frame[:] = (90, 110, 120)
+        cv2.ellipse(frame, (cx, cy), (face_w, face_h), 0, 0, 360,
+                    (150, 180, 225), -1)
+        for side in (-1, 1):
+            eye = (cx + side * face_w // 2, cy - face_h // 4)
+            cv2.ellipse(frame, eye, (face_w // 5, face_h // 10 if eye_open
+                                     else 2), 0, 0, 360, (250, 250, 250), -1)
+            if eye_open:
+                cv2.circle(frame, eye, face_h // 14, (60, 40, 30), -1)
+            cv2.line(frame, (eye[0] - face_w // 5, eye[1] - face_h // 5),
+                     (eye[0] + face_w // 5, eye[1] - face_h // 5),
+                     (40, 50, 70), 4)
+        cv2.line(frame, (cx, cy - face_h // 8), (cx, cy + face_h // 5),
+                 (110, 140, 190), 3)
+        cv2.ellipse(frame, (cx, cy + face_h // 2),
+                    (face_w // 3, face_h // 6 if mouth_open else 3), 0, 0,
+                    360, (40, 40, 130), -1)
+        # A view, so that consumers can mark it read-only.
+        return True, frame.view()
+
+
+def create_camera_source(spec: str) -> CameraSource:
+    """Create a source from a command line specification.
+
+    Args:
+        spec (str): one of file:PATH, images:DIRECTORY or synthetic
+
+    Raises:
+        ValueError: if spec isn't recognised
+    """
+    kind, _, argument = spec.partition(":")
+    if kind == "file" and argument:
+        return VideoFileSource(Path(argument))
+    if kind == "images" and argument:
+        return ImageDirectorySource(Path(argument))
+    if kind == "synthetic" and not argument:
+        return SyntheticFaceSource()
+    raise ValueError(f'Unknown camera source "{spec}".'
+                     ' Expected file:PATH, images:DIRECTORY or synthetic.')
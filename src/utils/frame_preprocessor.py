@@ -0,0 +1,87 @@
+import logging
+
+import cv2
+import numpy as np
+import numpy.typing as npt
+
+logger = logging.getLogger("FramePreprocessor")
+
+
+def mirror_bgr_to_rgb(src: npt.NDArray[np.uint8],
+                      dst: npt.NDArray[np.uint8]) -> None:
+    """Mirror a BGR frame horizontally and convert it to RGB, in one pass.
+
+    Mirroring a row of pixels and reversing the channels of each pixel
+    together reverse the bytes of the row, so both are one flip of the rows
+    seen as single channel images.
+
+    Args:
+        src (ndarray): (height, width, 3) uint8 BGR frame
+        dst (ndarray): C-contiguous uint8 output buffer of the same shape
+    """
+    h, w = src.shape[:2]
+    cv2.flip(src.reshape(h, w * 3), 1, dst=dst.reshape(h, w * 3))
+
+
+class FramePreprocessor:
+    """Crop, resize, mirror and colour convert camera frames without
+    allocating.
+
+    Output is written into a caller supplied buffer, typically a slot of the
+    frame ring buffer. The crop geometry and the intermediate resize buffer are
+    cached until the camera or output resolution changes.
+    """
+
+    def __init__(self):
+        self.geometry = None
+        self.crop_x = None
+        self.resize_buffer = None
+
+    def configure(self, in_shape: tuple, out_shape: tuple) -> None:
+        h, w = in_shape[:2]
+        out_h, out_w = out_shape[:2]
+        self.geometry = (h, w, out_h, out_w)
+
+        if h == out_h and w == out_w:
+            self.crop_x = None
+            self.resize_buffer = None
+            logger.info(f"Camera frames {w}x{h} are used without resizing")
+            return
+
+        # Trim the sides to 4:3 before resizing.
+        target_width = int(h * 4 / 3)
+        if w > target_width:
+            trim_left = (w - target_width) // 2
+            self.crop_x = slice(trim_left, trim_left + target_width)
+        else:
+            self.crop_x = slice(None)
+        self.resize_buffer = np.empty((out_h, out_w, 3), np.uint8)
+        logger.info(f"Camera frames {w}x{h} are cropped to columns"
+                    f" {self.crop_x.start}:{self.crop_x.stop} and resized to"
+                    f" {out_w}x{out_h}")
+
+    def process(self, frame_bgr: npt.NDArray[np.uint8],
+                dst: npt.NDArray[np.uint8]) -> npt.NDArray[np.uint8]:
+        """Convert a BGR camera frame to a mirrored RGB frame of dst's size.
+
+        Args:
+            frame_bgr (ndarray): frame from the camera
+            dst (ndarray): C-contiguous (height, width, 3) uint8 output
+                buffer
+
+        Returns:
+            ndarray: dst
+        """
+        h, w = frame_bgr.shape[:2]
+        out_h, out_w = dst.shape[:2]
+        if self.geometry != (h, w, out_h, out_w):
+            self.configure(frame_bgr.shape, dst.shape)
+
+        if self.resize_buffer is None:
+            src = frame_bgr
+        else:
+            src = cv2.resize(frame_bgr[:, self.crop_x], (out_w, out_h),
+                             dst=self.resize_buffer)
+
+        mirror_bgr_to_rgb(src, dst)
+        return dst
@@ -0,0 +1,96 @@
+import threading
+
+import numpy as np
+import numpy.typing as npt
+
+N_SLOTS = 4
+
+
+class FrameRingBuffer:
+    """Preallocated frame slots written by a single producer thread.
+
+    Every committed frame is tagged with an increasing sequence number and its
+    capture timestamp. Consumers borrow read-only views of the latest slot and
+    use the sequence number to tell whether they have already processed it. A
+    borrowed view stays valid until the producer wraps around to its slot
+    again, that is for the next N_SLOTS - 1 frames.
+    """
+
+    def __init__(self, n_slots: int = N_SLOTS):
+        self.n_slots = n_slots
+        self.condition = threading.Condition()
+        self.frames = None
+        self.seqs = [0] * n_slots
+        self.timestamps = [0.0] * n_slots
+        self.write_slot = 0
+        self.latest_slot = None
+        self.latest_seq = 0
+
+    def get_write_buffer(self, shape: tuple) -> npt.NDArray[np.uint8]:
+        """Get the slot that the next commit() will publish. Slots are only
+        reallocated if the frame shape changes.
+
+        Args:
+            shape (tuple): (height, width, channels) of the frame
+
+        Returns:
+            ndarray: writable slot for the producer
+        """
+        if self.frames is None or self.frames.shape[1:] != tuple(shape):
+            with self.condition:
+                # Views borrowed from the old slots keep them alive.
+                self.frames = np.zeros((self.n_slots, *shape), np.uint8)
+                self.latest_slot = None
+        return self.frames[self.write_slot]
+
+    def commit(self, timestamp: float) -> int:
+        """Publish the slot returned by get_write_buffer().
+
+        Args:
+            timestamp (float): capture time, from time.perf_counter()
+
+        Returns:
+            int: sequence number of the published frame
+        """
+        with self.condition:
+            self.latest_seq += 1
+            slot = self.write_slot
+            self.seqs[slot] = self.latest_seq
+            self.timestamps[slot] = timestamp
+            self.latest_slot = slot
+            self.write_slot = (slot + 1) % self.n_slots
+            self.condition.notify_all()
+        return self.latest_seq
+
+    def get_latest(self) -> tuple[int, float, npt.NDArray[np.uint8]] | None:
+        """Borrow the latest frame.
+
+        Returns:
+            tuple: (sequence number, capture timestamp, read-only frame view)
+                or None if no frame has been committed since the last clear()
+        """
+        with self.condition:
+            slot = self.latest_slot
+            if slot is None:
+                return None
+            view = self.frames[slot].view()
+            seq = self.seqs[slot]
+            timestamp = self.timestamps[slot]
+        view.flags.writeable = False
+        return seq, timestamp, view
+
+    def wait_newer(self, seq: int, timeout: float) -> bool:
+        """Block until a frame newer than seq is committed.
+
+        Returns:
+            bool: True if a newer frame is available, False on timeout
+        """
+        with self.condition:
+            return self.condition.wait_for(
+                lambda: self.latest_slot is not None and self.latest_seq > seq,
+                timeout)
+
+    def clear(self) -> None:
+        """Forget the latest frame. Sequence numbers keep increasing."""
+        with self.condition:
+            self.latest_slot = None
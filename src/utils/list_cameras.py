@@ -1,73 +1,111 @@
 import concurrent.futures as futures
+import json
 import logging
 import platform
+from pathlib import Path
 
 import cv2
 
+from .camera_source import CameraSource, hardware_source
+
 if platform.system() == "Windows":
     import pygrabber.dshow_graph
 
 logger = logging.getLogger("ListCamera")
 
 
-def __open_camera_task(i):
+def __open_camera_task(i, keep_open=True):
 
     logger.info(f"Try opening camera: {i}")
 
+    camera = hardware_source(i)
     try:
-        camera = cv2.VideoCapture(cv2.CAP_DSHOW + i)
-
-        if camera.getBackendName() != "DSHOW":
-            logger.info(f"Camera {i}: {camera.getBackendName()} is not supported")
+        if not camera.open():
             return (False, i, None)
 
-        if camera.get(cv2.CAP_PROP_FRAME_WIDTH) <= 0:
-            logger.info(f"Camera {i}: frame size error.")
-            return False, i, None
-
         ret, frame = camera.read()
         cv2.waitKey(1)
 
         if not ret:
             logger.info(f"Camera {i}: No frame returned")
+            camera.release()
             return (False, i, None)
 
         h, w, _ = frame.shape
-        logger.info(f"Camera {i}: {camera} height: {h} width: {w}")
+        logger.info(f"Camera {i}: {camera.name} height: {h} width: {w}")
+        if not keep_open:
+            camera.release()
 
         return (True, i, camera)
     except Exception as e:
         logger.warning(f"Camera {i}: not found {e}")
+        camera.release()
         return (False, i, None)
 
 
-def assign_cameras_unblock(cameras, i):
-    ret, _, camera = __open_camera_task(i)
-    if not ret:
-        logger.info(f"Camera {i}: Failed to open")
-    if camera is not None:
-        cameras[i] = camera
+def assign_cameras_unblock(cameras: dict[int, CameraSource], i):
+    camera = cameras.get(i)
+    if camera is None:
+        ret, _, camera = __open_camera_task(i)
+    else:
+        ret = camera.open()
 
+    if ret:
+        cameras[i] = camera
     else:
+        logger.info(f"Camera {i}: Failed to open")
         if i in cameras:
             del cameras[i]
 
 
-def assign_cameras_queue(cameras, done_callback: callable, max_search: int):
-
-    for i in range(max_search):
-
-        # block
+def assign_cameras_queue(cameras: dict[int, CameraSource],
+                         done_callback: callable,
+                         max_search: int,
+                         pool: futures.Executor,
+                         first_ids: tuple = ()):
+    """Find the cameras. The first of first_ids that opens is kept open and
+    done_callback is called straight away. The other ids are probed in
+    parallel and added to cameras as they're found, released. If none of
+    first_ids opened, done_callback is called when probing is complete.
+
+    Args:
+        cameras (dict): camera id to CameraSource, filled in here
+        done_callback (callable): called once, when a camera can be picked
+        max_search (int): number of camera ids to try
+        pool (Executor): runs the probes
+        first_ids (tuple): ids to try first, in order, for example the
+            configured camera and the last known-good camera
+    """
+    tried = set()
+    done = False
+    for i in first_ids:
+        if i in tried or not 0 <= i < max_search:
+            continue
+        tried.add(i)
         ret, _, camera = __open_camera_task(i)
+        if ret:
+            cameras[i] = camera
+            done_callback()
+            done = True
+            break
+        logger.info(f"Camera {i}: Failed to open")
+
+    probes = [
+        pool.submit(__open_camera_task, i, False) for i in range(max_search)
+        if i not in tried
+    ]
+    for probe in futures.as_completed(probes):
+        ret, i, camera = probe.result()
         if not ret:
             logger.info(f"Camera {i}: Failed to open")
         if camera is not None:
             cameras[i] = camera
 
-    done_callback()
+    if not done:
+        done_callback()
 
 
-def open_camera(cameras, i):
+def open_camera(cameras: dict[int, CameraSource], i):
     """For swapping camera
     """
     pool = futures.ThreadPoolExecutor(max_workers=1)
@@ -79,3 +117,32 @@ def get_camera_name(i: int) -> str | None:
         return str(pygrabber.dshow_graph.FilterGraph().get_input_devices()[i])
     else:
         return None
+
+
+def load_camera_cache(path: Path) -> dict:
+    """Read the last known-good camera.
+
+    Returns:
+        dict: with camera_id, width and height, or empty if there's no cache
+    """
+    try:
+        with path.open() as file:
+            cache = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def save_camera_cache(path: Path, camera_id: int, width: int, height: int):
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w") as file:
+            json.dump({
+                "camera_id": camera_id,
+                "width": width,
+                "height": height
+            },
+                      file,
+                      indent=4)
+    except OSError as e:
+        logger.warning(f'Failed to save camera cache "{path}": {e}')
@@ -0,0 +1,166 @@
+import abc
+import time
+
+import numpy as np
+import numpy.typing as npt
+
+from .smoothing import KalmanFilter
+
+# Longest time in seconds that a location is extrapolated past the latest
+# sample, so that a lost face doesn't send the pointer flying.
+MAX_PREDICTION = 0.1
+
+# Kalman noise parameters, in frame pixels and seconds.
+KALMAN_PROCESS_NOISE = 2000.0**2
+KALMAN_MEASUREMENT_NOISE = 1.0
+
+
+class PointerPredictor(metaclass=abc.ABCMeta):
+    """Estimates the tracking location at any time from timestamped detector
+    samples, so that the pointer can move on every tick rather than in steps
+    at the camera frame rate.
+
+    Samples are timestamped with their camera capture time, on the
+    time.perf_counter() clock, and predict() is called with the current time
+    on the same clock. Samples with a timestamp that isn't newer than the
+    latest are ignored.
+    """
+
+    def __init__(self):
+        self.location = None
+        self.timestamp = None
+
+    def reset(self) -> None:
+        self.location = None
+        self.timestamp = None
+
+    def add_sample(self, location: npt.ArrayLike, timestamp: float) -> None:
+        if self.timestamp is not None and timestamp <= self.timestamp:
+            return
+        location = np.asarray(location, dtype=np.float64)
+        self.on_sample(location, timestamp)
+        self.location = location
+        self.timestamp = timestamp
+
+    def on_sample(self, location: npt.NDArray, timestamp: float) -> None:
+        """Called with each new sample, before it becomes the latest."""
+        pass
+
+    @abc.abstractmethod
+    def predict(self, timestamp: float) -> npt.NDArray | None:
+        """
+        Returns:
+            ndarray: estimated location, or None if there are no samples
+        """
+        pass
+
+
+class HoldPredictor(PointerPredictor):
+    """Latest sample, as before prediction was added."""
+
+    def predict(self, timestamp: float) -> npt.NDArray | None:
+        return self.location
+
+
+class LinearPredictor(PointerPredictor):
+    """Interpolates from the previous sample to the latest one over the time
+    between their arrivals. The pointer runs one sample behind but moves
+    smoothly.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.previous = None
+        self.arrival = None
+        self.interval = None
+
+    def reset(self) -> None:
+        super().reset()
+        self.previous = None
+        self.arrival = None
+        self.interval = None
+
+    def on_sample(self, location: npt.NDArray, timestamp: float) -> None:
+        # Interpolation is by arrival time because that's when the pointer
+        # thread sees the samples.
+        self.previous = self.location
+        self.arrival = time.perf_counter()
+        if self.timestamp is not None:
+            self.interval = timestamp - self.timestamp
+
+    def predict(self, timestamp: float) -> npt.NDArray | None:
+        if self.previous is None or not self.interval:
+            return self.location
+        fraction = min((time.perf_counter() - self.arrival) / self.interval,
+                       1.0)
+        return self.previous + (self.location - self.previous) * fraction
+
+
+class ConstantVelocityPredictor(PointerPredictor):
+    """Extrapolates from the latest sample with the velocity between the
+    latest two, which also makes up for the detection latency.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.velocity = None
+
+    def reset(self) -> None:
+        super().reset()
+        self.velocity = None
+
+    def on_sample(self, location: npt.NDArray, timestamp: float) -> None:
+        if self.location is not None:
+            self.velocity = ((location - self.location) /
+                             (timestamp - self.timestamp))
+
+    def predict(self, timestamp: float) -> npt.NDArray | None:
+        if self.velocity is None:
+            return self.location
+        horizon = min(max(timestamp - self.timestamp, 0.0), MAX_PREDICTION)
+        return self.location + self.velocity * horizon
+
+
+class KalmanPredictor(PointerPredictor):
+    """Extrapolates a constant-velocity Kalman filter of the samples."""
+
+    def __init__(self):
+        super().__init__()
+        self.filter = KalmanFilter(KALMAN_PROCESS_NOISE,
+                                   KALMAN_MEASUREMENT_NOISE)
+
+    def reset(self) -> None:
+        super().reset()
+        self.filter.reset()
+
+    def on_sample(self, location: npt.NDArray, timestamp: float) -> None:
+        self.filter.update(location, timestamp)
+
+    def predict(self, timestamp: float) -> npt.NDArray | None:
+        if self.location is None:
+            return None
+        horizon = min(max(timestamp - self.timestamp, 0.0), MAX_PREDICTION)
+        return self.filter.predict(self.timestamp + horizon)
+
+
+PREDICTORS = {
+    "none": HoldPredictor,
+    "linear": LinearPredictor,
+    "constant_velocity": ConstantVelocityPredictor,
+    "kalman": KalmanPredictor,
+}
+
+
+def create_pointer_predictor(mode: str) -> PointerPredictor:
+    """
+    Args:
+        mode (str): none, linear, constant_velocity or kalman
+
+    Raises:
+        ValueError: if mode isn't one of those
+    """
+    try:
+        return PREDICTORS[mode]()
+    except KeyError:
+        raise ValueError(f'Unknown pointer prediction "{mode}".'
+                         f' Expected one of {", ".join(PREDICTORS)}.')
@@ -0,0 +1,98 @@
+import threading
+import time
+
+import numpy as np
+
+# Sleep until this long before a deadline, then spin. OS sleeps can overshoot
+# by about a millisecond, more on older Windows versions.
+SPIN_TIME = 0.001
+
+# Longest sleep between checks of the stop flag. Sleeping is done with
+# time.sleep, which uses a high resolution timer on Windows, unlike
+# Event.wait, which has the system timer granularity of about 15.6 ms.
+STOP_CHECK_TIME = 0.005
+
+# Number of recent ticks that jitter statistics are computed over.
+JITTER_WINDOW = 512
+
+
+class DeadlineScheduler:
+    """Paces a loop at a fixed interval by waiting for absolute deadlines on
+    the time.perf_counter() clock. The time an iteration takes is absorbed,
+    so the rate doesn't drift.
+
+    Each wait sleeps until shortly before the deadline then spins to it. If
+    the loop falls more than an interval behind, missed deadlines are skipped
+    rather than run back to back.
+
+    Args:
+        interval (float): seconds between deadlines
+        spin_time (float): seconds before the deadline to stop sleeping
+    """
+
+    def __init__(self, interval: float, spin_time: float = SPIN_TIME):
+        self.interval = interval
+        self.spin_time = spin_time
+        self.next_deadline = None
+        self.lateness = np.zeros(JITTER_WINDOW)
+        self.n_ticks = 0
+        self.n_missed = 0
+
+    def set_interval(self, interval: float) -> None:
+        self.interval = interval
+
+    def reset(self) -> None:
+        """Start again from the next wait(), for example after a pause."""
+        self.next_deadline = None
+
+    def wait(self, stop_flag: threading.Event | None = None) -> None:
+        """Block until the next deadline.
+
+        Args:
+            stop_flag (Event): ends the wait early if set
+        """
+        now = time.perf_counter()
+        if self.next_deadline is None:
+            self.next_deadline = now + self.interval
+            return
+
+        deadline = self.next_deadline
+        wake_time = deadline - self.spin_time
+        while now < wake_time:
+            if stop_flag is not None and stop_flag.is_set():
+                return
+            time.sleep(min(wake_time - now, STOP_CHECK_TIME))
+            now = time.perf_counter()
+        while now < deadline:
+            # Yield to other threads while spinning.
+            time.sleep(0)
+            now = time.perf_counter()
+
+        self.lateness[self.n_ticks % JITTER_WINDOW] = now - deadline
+        self.n_ticks += 1
+
+        deadline += self.interval
+        if deadline <= now:
+            missed = int((now - deadline) // self.interval) + 1
+            self.n_missed += missed
+            deadline += missed * self.interval
+        self.next_deadline = deadline
+
+    def get_jitter(self) -> dict:
+        """Lateness of recent ticks after their deadlines.
+
+        Returns:
+            dict: ticks and missed counts, and mean, p50, p99 and max
+                lateness in milliseconds
+        """
+        n = min(self.n_ticks, JITTER_WINDOW)
+        stats = {"ticks": self.n_ticks, "missed": self.n_missed}
+        if n == 0:
+            return stats
+        lateness_ms = self.lateness[:n] * 1000
+        p50, p99 = np.percentile(lateness_ms, (50, 99))
+        stats.update(mean_ms=float(lateness_ms.mean()),
+                     p50_ms=float(p50),
+                     p99_ms=float(p99),
+                     max_ms=float(lateness_ms.max()))
+        return stats
@@ -1,3 +1,5 @@
+import math
+
 import numpy as np
 import numpy.typing as npt
 
@@ -9,7 +11,179 @@ def calc_smooth_kernel(n: int) -> npt.ArrayLike:
     return kernel.reshape(n, 1)
 
 
-def apply_smoothing(data: npt.ArrayLike,
-                    kernel: npt.ArrayLike) -> npt.ArrayLike:
-    smooth_n = len(kernel)
-    return sum(kernel * data[-smooth_n:])
+class FIRFilter:
+    """Weighted moving average of the latest len(kernel) samples, the first
+    kernel weight applying to the oldest sample.
+
+    Every sample is written twice into a circular buffer of twice the kernel
+    length, so the latest samples are always one contiguous window and
+    nothing is shifted on update.
+    """
+
+    def __init__(self, kernel: npt.ArrayLike, n_dims: int):
+        self.kernel = np.asarray(kernel, dtype=np.float64).reshape(-1)
+        self.n_taps = len(self.kernel)
+        self.buffer = np.zeros((self.n_taps * 2, n_dims))
+        self.pos = 0
+
+    def reset(self, value: npt.ArrayLike = 0.0) -> None:
+        self.buffer[:] = value
+        self.pos = 0
+
+    def update(self, sample: npt.ArrayLike) -> npt.NDArray:
+        self.buffer[self.pos] = sample
+        self.buffer[self.pos + self.n_taps] = sample
+        self.pos = (self.pos + 1) % self.n_taps
+        return self.kernel @ self.buffer[self.pos:self.pos + self.n_taps]
+
+
+class EMAFilter:
+    """Exponential moving average."""
+
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self.value = None
+
+    def reset(self) -> None:
+        self.value = None
+
+    def update(self, sample: npt.ArrayLike) -> npt.NDArray:
+        sample = np.asarray(sample, dtype=np.float64)
+        if self.value is None:
+            self.value = sample.copy()
+        else:
+            self.value += self.alpha * (sample - self.value)
+        return self.value.copy()
+
+
+def smoothing_factor(dt: float, cutoff: npt.ArrayLike) -> npt.ArrayLike:
+    r = 2 * math.pi * cutoff * dt
+    return r / (r + 1)
+
+
+class OneEuroFilter:
+    """One Euro filter, Casiez et al. CHI 2012.
+
+    A low-pass filter whose cutoff frequency rises with speed: strong smoothing
+    at rest, little lag during fast motion.
+
+    Args:
+        min_cutoff (float): cutoff frequency at rest, in Hz
+        beta (float): how fast the cutoff rises with speed
+        d_cutoff (float): cutoff frequency for the speed estimate, in Hz
+    """
+
+    def __init__(self,
+                 min_cutoff: float = 1.0,
+                 beta: float = 0.0,
+                 d_cutoff: float = 1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.x_prev = None
+        self.dx_prev = None
+        self.t_prev = None
+
+    def reset(self) -> None:
+        self.x_prev = None
+        self.dx_prev = None
+        self.t_prev = None
+
+    def update(self, sample: npt.ArrayLike, timestamp: float) -> npt.NDArray:
+        """
+        Args:
+            sample (ArrayLike): new sample
+            timestamp (float): sample time in seconds
+
+        Returns:
+            ndarray: filtered sample
+        """
+        x = np.asarray(sample, dtype=np.float64)
+        if self.x_prev is None:
+            self.x_prev = x.copy()
+            self.dx_prev = np.zeros_like(x)
+            self.t_prev = timestamp
+            return x.copy()
+
+        dt = timestamp - self.t_prev
+        if dt <= 0:
+            return self.x_prev.copy()
+
+        a_d = smoothing_factor(dt, self.d_cutoff)
+        dx = (x - self.x_prev) / dt
+        dx_hat = a_d * dx + (1 - a_d) * self.dx_prev
+
+        cutoff = self.min_cutoff + self.beta * np.abs(dx_hat)
+        a = smoothing_factor(dt, cutoff)
+        x_hat = a * x + (1 - a) * self.x_prev
+
+        self.x_prev = x_hat
+        self.dx_prev = dx_hat
+        self.t_prev = timestamp
+        return x_hat.copy()
+
+
+class KalmanFilter:
+    """Constant-velocity Kalman filter, applied to each dimension
+    independently with the same noise parameters.
+
+    Args:
+        process_noise (float): variance of the unmodelled acceleration, in
+            units per second squared, squared
+        measurement_noise (float): variance of the measurements, in units
+            squared
+    """
+
+    def __init__(self, process_noise: float, measurement_noise: float):
+        self.q = process_noise
+        self.r = measurement_noise
+        self.x = None
+        self.v = None
+        # Covariance of position and velocity. The same for every dimension
+        # because all dimensions share the time steps and noise parameters.
+        self.p = None
+        self.t_prev = None
+
+    def reset(self) -> None:
+        self.x = None
+        self.v = None
+        self.p = None
+        self.t_prev = None
+
+    def update(self, sample: npt.ArrayLike, timestamp: float) -> npt.NDArray:
+        """
+        Args:
+            sample (ArrayLike): new measurement
+            timestamp (float): measurement time in seconds
+
+        Returns:
+            ndarray: filtered position
+        """
+        z = np.asarray(sample, dtype=np.float64)
+        if self.x is None:
+            self.x = z.copy()
+            self.v = np.zeros_like(z)
+            self.p = np.array(((self.r, 0.0), (0.0, self.r * 1e4)))
+            self.t_prev = timestamp
+            return self.x.copy()
+
+        dt = timestamp - self.t_prev
+        if dt > 0:
+            # Predict.
+            self.x += self.v * dt
+            f = np.array(((1.0, dt), (0.0, 1.0)))
+            q = self.q * np.array(((dt**4 / 4, dt**3 / 2), (dt**3 / 2, dt**2)))
+            self.p = f @ self.p @ f.T + q
+            self.t_prev = timestamp
+
+        # Correct, with the position measured.
+        k = self.p[:, 0] / (self.p[0, 0] + self.r)
+        innovation = z - self.x
+        self.x += k[0] * innovation
+        self.v += k[1] * innovation
+        self.p = self.p - np.outer(k, self.p[0])
+        return self.x.copy()
+
+    def predict(self, timestamp: float) -> npt.NDArray:
+        """Position extrapolated to a time, without changing the state."""
+        return self.x + self.v * (timestamp - self.t_prev)
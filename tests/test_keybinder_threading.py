@@ -0,0 +1,108 @@
+"""\
+Pausing the Keybinder from the pipeline thread, which mustn't touch Tk.
+
+Runs headless, on the stand-ins of benchmarks.recording_input:
+
+    python -m unittest discover tests
+"""
+import threading
+import unittest
+
+import numpy as np
+
+from benchmarks import recording_input
+from benchmarks.pipeline_benchmark import load_config
+
+recording_input.install()
+
+# Imported after the stand-ins are installed.
+import src.shape_list as shape_list  # noqa: E402
+from src.config_manager import ConfigManager  # noqa: E402
+from src.controllers import Keybinder  # noqa: E402
+
+# Reset first, since it doesn't run once paused.
+META_BINDINGS = {
+    "Raise left eyebrow": ["meta", "reset", 0.5, "single", 0.0],
+    "Open mouth": ["meta", "pause", 0.5, "single", 0.0],
+}
+
+
+class KeybinderThreadingTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        load_config(None)
+        ConfigManager().config["input_backend"] = "recording"
+        ConfigManager().config["auto_play"] = True
+        Keybinder().start()
+
+    def setUp(self):
+        # Threads that the traces of the Tk variable ran on.
+        self.trace_threads = []
+        self.trace_name = Keybinder().is_active.trace_add(
+            "write",
+            lambda *args: self.trace_threads.append(threading.current_thread()))
+        Keybinder().set_active(True)
+        self.trace_threads.clear()
+
+    def tearDown(self):
+        Keybinder().is_active.trace_remove("write", self.trace_name)
+        Keybinder().init_states()
+
+    def toggle_on_worker(self):
+        worker = threading.Thread(target=Keybinder().toggle_active)
+        worker.start()
+        worker.join()
+
+    def test_toggle_from_worker_thread(self):
+        self.toggle_on_worker()
+
+        # The bindings are paused at once, without writing the Tk variable.
+        self.assertFalse(Keybinder().active_flag)
+        self.assertTrue(Keybinder().is_active.get())
+        self.assertEqual(self.trace_threads, [])
+
+        Keybinder().sync_active_var()
+        self.assertFalse(Keybinder().is_active.get())
+        self.assertEqual(self.trace_threads, [threading.current_thread()])
+
+        self.toggle_on_worker()
+        self.assertTrue(Keybinder().active_flag)
+        Keybinder().sync_active_var()
+        self.assertTrue(Keybinder().is_active.get())
+
+    def test_set_active_on_tk_thread(self):
+        Keybinder().set_active(False)
+        self.assertFalse(Keybinder().active_flag)
+        self.assertFalse(Keybinder().is_active.get())
+        self.assertEqual(self.trace_threads, [threading.current_thread()])
+
+        # Nothing left to copy.
+        Keybinder().sync_active_var()
+        self.assertEqual(len(self.trace_threads), 1)
+
+    def test_gui_write_updates_flag(self):
+        Keybinder().is_active.set(False)
+        self.assertFalse(Keybinder().active_flag)
+
+    def test_meta_actions_on_worker_thread(self):
+        ConfigManager().set_throttle_time(0)
+        Keybinder().compile_bindings(META_BINDINGS)
+        values = np.zeros(len(shape_list.blendshape_names))
+        for shape_name in META_BINDINGS:
+            values[shape_list.blendshape_indices[shape_name]] = 1.0
+        n_events = len(Keybinder().sink.events)
+
+        worker = threading.Thread(target=Keybinder().act, args=(values,))
+        worker.start()
+        worker.join()
+
+        # Reset moved the pointer, and pause left the Tk variable alone.
+        self.assertEqual(Keybinder().sink.events[n_events:][0][1], "move_to")
+        self.assertFalse(Keybinder().active_flag)
+        self.assertTrue(Keybinder().is_active.get())
+        self.assertEqual(self.trace_threads, [])
+
+
+if __name__ == "__main__":
+    unittest.main()